@@ -0,0 +1,379 @@
+"""
+Headless benchmarks for RPN.
+
+Drives RPNEvent.on_modified and PrintToRpnCommand.run through stand-in sublime
+modules and writes the results as JSON so that they can be compared between
+releases.
+
+    python benchmarks/bench_rpn.py [--quick] [--output FILE] [--compare BASELINE]
+                                   [--journal JOURNAL]
+
+With --journal, the records of an RPN journal (journal.bin, in the RPN folder of
+Sublime's cache) are replayed as a deterministic workload.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import tempfile
+import platform
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sublime_stub
+
+PACKAGE = sublime_stub.install()
+glb = sys.modules['RPN.rpn_globals']
+rpn = sys.modules['RPN.rpn']
+print_to_rpn = sys.modules['RPN.print_to_rpn']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+SpillStack = sys.modules['RPN.rpn_stack'].SpillStack
+rpn_journal = sys.modules['RPN.rpn_journal']
+
+# Every listener would otherwise replay the session of the one before it from the
+# journal. The cost of journaling is measured on its own, by bench_journal_append.
+cfg.journal = False
+
+########################################################################################
+# Helpers
+
+#--------------------------------------------
+def summarize(samples):
+    "Return a dictionary of statistics (in microseconds) for a list of timings in seconds"
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'count':  count,
+        'min_us': samples[0] * 1e6,
+        'med_us': samples[count // 2] * 1e6,
+        'p95_us': samples[min(count - 1, int(count * 0.95))] * 1e6,
+        'max_us': samples[-1] * 1e6,
+    }
+
+#--------------------------------------------
+def time_call(func, repeat):
+    "Call func repeat times and return the list of timings"
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+#--------------------------------------------
+def random_values(count, integers=False, seed=1972):
+    rng = random.Random(seed)
+    if integers:
+        return [rng.randrange(0, cfg.bin_max_val) for _ in range(count)]
+    return [rng.uniform(-1e6, 1e6) for _ in range(count)]
+
+########################################################################################
+# Benchmarks
+
+#--------------------------------------------
+def bench_keystroke(depths, repeat):
+    """
+    Per-keystroke latency against stack depth. Each keystroke is one on_modified call,
+    including the redraw of the RPN view when the key completes a command.
+    """
+
+    results = []
+    for depth in depths:
+        listener, view = sublime_stub.new_rpn_view()
+        listener.mode = glb.BASIC
+        listener.stack = SpillStack(random_values(depth))
+        listener.update_rpn(view)
+
+        timings = {'digit': [], 'enter': [], 'operator': []}
+        for _ in range(repeat):
+            listener.prev_stack = []
+            for key, char in (('digit', '7'), ('enter', '\n'), ('operator', '+')):
+                start = time.perf_counter()
+                view.type(char)
+                timings[key].append(time.perf_counter() - start)
+
+        for key, samples in sorted(timings.items()):
+            result = {'depth': depth, 'key': key}
+            result.update(summarize(samples))
+            results.append(result)
+    return results
+
+#--------------------------------------------
+def bench_journal_append(depth, repeat):
+    """
+    Per-keystroke latency with the journal on. The session has a cache folder of its
+    own and is closed afterwards, so that it is not replayed by later benchmarks.
+    Writing the buffered records (flush) is timed separately from the keystrokes.
+    """
+
+    saved_cache = sublime_stub.CACHE_PATH
+    sublime_stub.CACHE_PATH = tempfile.mkdtemp(dir=saved_cache)
+    cfg.journal = True
+    try:
+        listener, view = sublime_stub.new_rpn_view()
+        listener.mode = glb.BASIC
+        listener.stack = SpillStack(random_values(depth))
+        listener.update_rpn(view)
+
+        timings = {'digit': [], 'enter': [], 'operator': [], 'flush': []}
+        for _ in range(repeat):
+            listener.prev_stack = []
+            for key, char in (('digit', '7'), ('enter', '\n'), ('operator', '+')):
+                start = time.perf_counter()
+                view.type(char)
+                timings[key].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            sublime_stub.run_pending()
+            timings['flush'].append(time.perf_counter() - start)
+        listener.on_close(view)
+    finally:
+        cfg.journal = False
+        sublime_stub.CACHE_PATH = saved_cache
+
+    results = []
+    for key, samples in sorted(timings.items()):
+        result = {'depth': depth, 'key': key}
+        result.update(summarize(samples))
+        results.append(result)
+    return results
+
+#--------------------------------------------
+def bench_undo_memory(depths):
+    "Memory held by prev_stack after pushing depth values one at a time."
+
+    results = []
+    for depth in depths:
+        listener, view = sublime_stub.new_rpn_view()
+        listener.mode = glb.BASIC
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(depth):
+            listener.process(('1',))
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results.append({'depth': depth,
+                        'undo_records': len(listener.prev_stack),
+                        'bytes': after - before,
+                        'bytes_per_value': (after - before) / depth})
+    return results
+
+#--------------------------------------------
+def bench_stack_memory(sizes):
+    "Memory held by a stack of size values, with older values spilled to disk."
+
+    results = []
+    for size in sizes:
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        stack = SpillStack(float(num) for num in range(size))
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({'size': size,
+                        'bytes': current,
+                        'peak_bytes': peak,
+                        'spilled': stack.visible()[0],
+                        'push_us': elapsed * 1e6 / size})
+        del stack
+    return results
+
+#--------------------------------------------
+def bench_print_val(repeat):
+    "Cost of PrintToRpnCommand.print_val per mode, base, and notation."
+
+    view = sublime_stub.View()
+    cmd = print_to_rpn.PrintToRpnCommand(view)
+    cmd.run(None, stack=[], mode=glb.BASIC, prev_mode=glb.BASIC, help_str=None,
+            base=glb.DEC, notation=glb.REGULAR, message="")
+
+    floats = random_values(200)
+    big_floats = [val * 1e6 for val in floats]
+    integers = random_values(200, integers=True)
+    huge = [3 ** (20000 + num) for num in range(200)]
+
+    cases = [('BASIC',      glb.BASIC,      glb.DEC, glb.REGULAR,     floats),
+             ('STATS',      glb.STATS,      glb.DEC, glb.REGULAR,     floats),
+             ('SCIENTIFIC', glb.SCIENTIFIC, glb.DEC, glb.REGULAR,     big_floats),
+             ('SCIENTIFIC', glb.SCIENTIFIC, glb.DEC, glb.ENGINEERING, big_floats)]
+    for base_name, base in (('BIN', glb.BIN), ('OCT', glb.OCT), ('DEC', glb.DEC), ('HEX', glb.HEX)):
+        cases.append(('PROGRAMMER_' + base_name, glb.PROGRAMMER, base, glb.REGULAR, integers))
+    cases.append(('SCIENTIFIC_HUGE_INT', glb.SCIENTIFIC, glb.DEC, glb.REGULAR, huge))
+
+    results = []
+    for name, mode, base, notation, values in cases:
+        cmd.mode, cmd.base, cmd.notation = mode, base, notation
+
+        def format_all():
+            for val in values:
+                cmd.print_val(val)
+
+        samples = [sample / len(values) for sample in time_call(format_all, repeat)]
+        result = {'case': name, 'notation': 'ENG' if notation == glb.ENGINEERING else 'REG'}
+        result.update(summarize(samples))
+        results.append(result)
+    return results
+
+#--------------------------------------------
+def bench_stats(sizes, repeat):
+    "STATS operations on the whole stack, run through run_command as a keypress would."
+
+    results = []
+    listener, view = sublime_stub.new_rpn_view()
+    listener.mode = glb.STATS
+    for size in sizes:
+        values = random_values(size)
+        for name in ('sum', 'avg', 'median'):
+            command = getattr(listener, name)
+            samples = []
+            for _ in range(repeat):
+                listener.stack, listener.prev_stack = SpillStack(values), []
+                start = time.perf_counter()
+                listener.run_command(command)
+                samples.append(time.perf_counter() - start)
+            result = {'size': size, 'op': name}
+            result.update(summarize(samples))
+            results.append(result)
+    return results
+
+#--------------------------------------------
+def bench_map_reduce(sizes, repeat):
+    "Map and reduce over the whole stack, typed as keys (M, then the command)."
+
+    results = []
+    listener, view = sublime_stub.new_rpn_view()
+    listener.mode = glb.SCIENTIFIC
+    for size in sizes:
+        values = [abs(val) for val in random_values(size)]
+        for name, keys in (('map_root', 'Mr'), ('map_scale', '2\nM*'), ('reduce_add', 'R+')):
+            samples = []
+            for _ in range(repeat):
+                listener.stack, listener.prev_stack = SpillStack(values), []
+                start = time.perf_counter()
+                view.type(keys)
+                samples.append(time.perf_counter() - start)
+            result = {'size': size, 'op': name}
+            result.update(summarize(samples))
+            results.append(result)
+    return results
+
+#--------------------------------------------
+def bench_journal(path, repeat):
+    "Replay the records of a journal, timing each kind of record and the whole replay."
+
+    records = list(rpn_journal.read_records(path))
+    timings, totals = {}, []
+    for _ in range(repeat):
+        listener, view = sublime_stub.new_rpn_view()
+        listener.replaying = True
+        start = time.perf_counter()
+        for record in records:
+            record_start = time.perf_counter()
+            listener.apply_record(record)
+            timings.setdefault(record[0], []).append(time.perf_counter() - record_start)
+        totals.append(time.perf_counter() - start)
+
+    results = []
+    for kind, samples in sorted(timings.items()):
+        result = {'record': kind}
+        result.update(summarize(samples))
+        results.append(result)
+    result = {'record': 'total', 'records': len(records)}
+    result.update(summarize(totals))
+    results.append(result)
+    return results
+
+########################################################################################
+# Comparison
+
+# the fields of a result entry that say what was measured
+KEY_FIELDS = ('depth', 'key', 'op', 'case', 'notation', 'size', 'record')
+
+#--------------------------------------------
+def compare(results, baseline, threshold):
+    """
+    Compare median timings with a baseline result file, matching entries by their
+    KEY_FIELDS. Entries found in only one of them are skipped. Returns a list of
+    regressions, each a (benchmark, key, baseline_us, current_us) tuple.
+    """
+
+    regressions = []
+    for bench, entries in results['benchmarks'].items():
+        old_entries = dict((entry_key(old), old) for old in baseline.get('benchmarks', {}).get(bench, []))
+        for entry in entries:
+            old = old_entries.get(entry_key(entry))
+            if old is None or 'med_us' not in entry or 'med_us' not in old:
+                continue
+            key = dict(entry_key(entry))
+            if entry['med_us'] > old['med_us'] * threshold:
+                regressions.append((bench, key, old['med_us'], entry['med_us']))
+    return regressions
+
+#--------------------------------------------
+def entry_key(entry):
+    "The fields that identify a result entry (depth, key, op, and so on), without its timings"
+    return tuple(sorted((k, v) for k, v in entry.items() if k in KEY_FIELDS))
+
+########################################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Use smaller sizes and fewer repeats")
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="Compare medians against a previous result file")
+    parser.add_argument('--journal', help="Also replay this RPN journal file as a workload")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Slowdown ratio counted as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        depths, undo_depths, stats_sizes, repeat = (10, 100, 1000), (100, 500), (1000, 100000), 5
+    else:
+        depths, undo_depths, stats_sizes, repeat = (10, 100, 1000, 10000), (100, 1000, 3000), (1000, 100000, 1000000), 20
+
+    results = {
+        'rpn_version': rpn.__version__,
+        'python':      platform.python_version(),
+        'platform':    platform.platform(),
+        'timestamp':   time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick':       args.quick,
+        'benchmarks': {
+            'keystroke_latency': bench_keystroke(depths, repeat),
+            'journal_append':    bench_journal_append(depths[1], repeat),
+            'undo_memory':       bench_undo_memory(undo_depths),
+            'stack_memory':      bench_stack_memory(stats_sizes),
+            'print_val':         bench_print_val(repeat),
+            'stats':             bench_stats(stats_sizes, max(1, repeat // 4)),
+            'map_reduce':        bench_map_reduce(stats_sizes, max(1, repeat // 4)),
+        },
+    }
+
+    if args.journal:
+        results['benchmarks']['journal_replay'] = bench_journal(args.journal, repeat)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as ifile:
+            baseline = json.load(ifile)
+        if baseline.get('quick') != args.quick:
+            sys.stderr.write("Cannot compare: {} was{} run with --quick\n".format(
+                args.compare, "" if baseline.get('quick') else " not"))
+            return 2
+        regressions = compare(results, baseline, args.threshold)
+        for bench, key, old, new in regressions:
+            sys.stderr.write("REGRESSION {} {}: {:.1f}us -> {:.1f}us\n".format(bench, key, old, new))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""
+Stand-ins for the sublime and sublime_plugin modules so that RPN can be driven
+headlessly, outside of Sublime Text.
+
+Only the parts of the API used by RPN are provided.
+"""
+
+import os
+import re
+import sys
+import types
+import atexit
+import shutil
+import importlib
+import tempfile
+
+PACKAGE_NAME = "RPN"
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+########################################################################################
+# sublime
+
+#--------------------------------------------
+class Region(object):
+    "A region of text, from a to b"
+
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+#--------------------------------------------
+class Settings(object):
+    "An in-memory settings object"
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def has(self, key):
+        return key in self.values
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+#--------------------------------------------
+class View(object):
+    "A text buffer that forwards modifications to the event listeners"
+
+    _next_id = 1
+
+    def __init__(self, window=None, name=""):
+        self.window_ref = window
+        self.view_name = name
+        self.text = ""
+        self.scratch = False
+        self.commands = {}
+        self.view_id = View._next_id
+        View._next_id += 1
+
+    def id(self):
+        return self.view_id
+
+    def window(self):
+        return self.window_ref
+
+    def name(self):
+        return self.view_name
+
+    def set_name(self, name):
+        self.view_name = name
+
+    def set_scratch(self, scratch):
+        self.scratch = scratch
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, region):
+        if isinstance(region, int):
+            return self.text[region:region+1]
+        return self.text[region.begin():region.end()]
+
+    def insert(self, edit, point, text):
+        self.text = self.text[:point] + text + self.text[point:]
+        return len(text)
+
+    def erase(self, edit, region):
+        self.text = self.text[:region.begin()] + self.text[region.end():]
+
+    def run_command(self, cmd, args=None):
+        "Run a TextCommand synchronously, then notify listeners as Sublime would."
+        try:
+            command = self.commands[cmd]
+        except KeyError:
+            command = self.commands[cmd] = text_command_class(cmd)(self)
+        command.run(None, **(args or {}))
+        notify_modified(self)
+
+    def type(self, chars):
+        "Simulate typing characters into the view, one on_modified per character"
+        for char in chars:
+            self.text += char
+            notify_modified(self)
+
+#--------------------------------------------
+class Window(object):
+    "A window holding views"
+
+    def __init__(self):
+        self.view_list = []
+        self.active = None
+
+    def views(self):
+        return list(self.view_list)
+
+    def new_file(self):
+        view = View(self)
+        self.view_list.append(view)
+        return view
+
+    def focus_view(self, view):
+        self.active = view
+        for listener in listeners:
+            if hasattr(listener, 'on_activated_async'):
+                listener.on_activated_async(view)
+
+    def active_view(self):
+        return self.active
+
+#--------------------------------------------
+listeners = []
+settings_files = {}
+windows = [Window()]
+clipboard = [""]
+errors = []
+pending = []
+
+def error_message(msg):
+    errors.append(msg)
+
+def status_message(msg):
+    pass
+
+def set_timeout(callback, delay=0):
+    "Callbacks without a delay run immediately, others when run_pending() is called"
+    if delay:
+        pending.append(callback)
+    else:
+        callback()
+
+def set_timeout_async(callback, delay=0):
+    "Callbacks run when run_pending() is called, as if in Sublime's async thread"
+    pending.append(callback)
+
+def run_pending():
+    while pending:
+        pending.pop(0)()
+
+def load_settings(name):
+    try:
+        return settings_files[name]
+    except KeyError:
+        settings_files[name] = Settings()
+        return settings_files[name]
+
+def save_settings(name):
+    pass
+
+def cache_path():
+    return CACHE_PATH
+
+def packages_path():
+    return os.path.dirname(PACKAGE_PATH)
+
+def active_window():
+    return windows[0]
+
+def set_clipboard(text):
+    clipboard[0] = text
+
+def get_clipboard():
+    return clipboard[0]
+
+def notify_modified(view):
+    for listener in listeners:
+        listener.on_modified(view)
+
+CACHE_PATH = tempfile.mkdtemp(prefix="rpn_bench_cache_")
+atexit.register(shutil.rmtree, CACHE_PATH, True)
+
+########################################################################################
+# sublime_plugin
+
+class EventListener(object):
+    pass
+
+class TextCommand(object):
+    def __init__(self, view):
+        self.view = view
+
+class WindowCommand(object):
+    def __init__(self, window):
+        self.window = window
+
+#--------------------------------------------
+def text_command_class(cmd):
+    "Find the TextCommand subclass whose snake-cased name is cmd."
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith(PACKAGE_NAME + '.'):
+            continue
+        for attr in dir(module):
+            cls = getattr(module, attr)
+            if isinstance(cls, type) and issubclass(cls, TextCommand) and cls is not TextCommand:
+                name = re.sub(r'(?<!^)(?=[A-Z])', '_', cls.__name__[:-len('Command')]).lower()
+                if name == cmd:
+                    return cls
+    raise KeyError("Unknown command: {}".format(cmd))
+
+########################################################################################
+def install():
+    """
+    Install the stand-in modules into sys.modules and import RPN as a package.
+    Returns the RPN package module.
+    """
+
+    sublime = types.ModuleType('sublime')
+    for name in ('Region', 'Settings', 'View', 'Window', 'error_message', 'status_message',
+                 'set_timeout', 'set_timeout_async', 'load_settings', 'save_settings',
+                 'cache_path', 'packages_path', 'active_window', 'set_clipboard',
+                 'get_clipboard'):
+        setattr(sublime, name, globals()[name])
+    sublime.windows = lambda: list(windows)
+
+    sublime_plugin = types.ModuleType('sublime_plugin')
+    sublime_plugin.EventListener = EventListener
+    sublime_plugin.TextCommand = TextCommand
+    sublime_plugin.WindowCommand = WindowCommand
+
+    sys.modules['sublime'] = sublime
+    sys.modules['sublime_plugin'] = sublime_plugin
+
+    # Sublime imports every top-level module of a package, which is named after its folder
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [PACKAGE_PATH]
+    sys.modules[PACKAGE_NAME] = package
+    for file_name in sorted(os.listdir(PACKAGE_PATH)):
+        if file_name.endswith('.py'):
+            importlib.import_module('{}.{}'.format(PACKAGE_NAME, file_name[:-3]))
+
+    # call plugin_loaded() just as Sublime does once the API is ready
+    for module_name, module in list(sys.modules.items()):
+        if module_name.startswith(PACKAGE_NAME + '.') and hasattr(module, 'plugin_loaded'):
+            module.plugin_loaded()
+    return package
+
+#--------------------------------------------
+def new_rpn_view():
+    "Create an RPNEvent listener and an RPN view connected to it. Returns (listener, view)"
+
+    rpn_event = sys.modules[PACKAGE_NAME + '.rpn_event']
+    rpn_settings = sys.modules[PACKAGE_NAME + '.rpn_settings']
+
+    del listeners[:]
+    listener = rpn_event.RPNEvent()
+    listeners.append(listener)
+
+    view = windows[0].new_file()
+    view.set_name(rpn_settings.cfg.window_name)
+    view.set_scratch(True)
+    windows[0].focus_view(view)
+    return listener, view
@@ -2,10 +2,101 @@
 Writes output to the RPN window.
 """
 
+import sys
 import sublime
 import sublime_plugin
-from decimal import Decimal, Context
+from decimal import Decimal, Context, ROUND_FLOOR, MAX_EMAX, MIN_EMIN
+from functools import lru_cache
 from . import rpn_globals as glb
+from . import rpn_bits
+from . import rpn_layouts
+from .rpn_settings import cfg
+
+#--------------------------------------------
+def group_digits(val_str, size=4):
+    "Add underscores between groups of size digits, counting from the right"
+    head = len(val_str) % size or size
+    return '_'.join([val_str[:head]] + [val_str[idx:idx+size] for idx in range(head, len(val_str), size)])
+
+#--------------------------------------------
+@lru_cache(maxsize=256)
+def readout_lines(val, bits):
+    """
+    Return the lines of the multi-base readout of a value. These are cached, since
+    the same values are drawn again after every key press.
+    """
+
+    unsigned = int(val) & cfg.bin_max_val
+    signed = unsigned - (1 << bits) if unsigned >> (bits - 1) else unsigned
+    formats = cfg.programmer_formats
+    return ("HEX {}".format(group_digits(formats[glb.HEX].format(unsigned))),
+            "DEC {}".format(unsigned),
+            "OCT {}".format(group_digits(formats[glb.OCT].format(unsigned))),
+            "BIN {}".format(group_digits(formats[glb.BIN].format(unsigned))),
+            "SGN {}".format(signed))
+
+#--------------------------------------------
+def is_huge(val):
+    return type(val) is int and val.bit_length() > glb.HUGE_INT_BITS
+
+#--------------------------------------------
+@lru_cache(maxsize=64)
+def leading_digits(val, prec):
+    """
+    Return a huge integer as a Decimal rounded to prec significant digits. The digits
+    and exponent come from the logarithm of its top bits and its bit_length, so
+    this costs the same however many digits the integer has.
+    """
+
+    mag = abs(val)
+    shift = max(0, mag.bit_length() - max(128, prec * 4 + 64))
+    ctx = Context(prec=prec + len(str(shift)) + 10)
+    log = ctx.add(ctx.log10(mag >> shift), ctx.multiply(shift, ctx.log10(2)))
+    exponent = int(log.to_integral_value(rounding=ROUND_FLOOR))
+    mantissa = Context(prec=prec).plus(ctx.power(10, log - exponent))
+    if mantissa >= 10:
+        mantissa, exponent = mantissa / 10, exponent + 1
+
+    result = Context(prec=prec, Emax=MAX_EMAX, Emin=MIN_EMIN).scaleb(mantissa, exponent)
+    return (-result if val < 0 else result).normalize(Context(prec=prec, Emax=MAX_EMAX, Emin=MIN_EMIN))
+
+#--------------------------------------------
+@lru_cache(maxsize=64)
+def leading_base_digits(val, base, bits):
+    """
+    Return the leading digits of a huge integer in BIN, OCT, or HEX, as many as fit
+    in bits, followed by its bit_length. Only the leading digits are converted.
+    """
+
+    digit_bits = {glb.BIN: 1, glb.OCT: 3, glb.HEX: 4}[base]
+    mag = abs(val)
+    length = mag.bit_length()
+    shift = max(0, -(-length // digit_bits) - bits // digit_bits) * digit_bits
+    digits = {glb.BIN: "{:b}", glb.OCT: "{:o}", glb.HEX: "{:X}"}[base].format(mag >> shift)
+    return "{}{}...  ({} bits)".format('-' if val < 0 else '', group_digits(digits), length)
+
+#--------------------------------------------
+def full_digits(val, base=None):
+    """
+    Return every digit of a value, in a programmer mode base if one is given. Python's
+    limit on the length of integer strings is lifted while this is done.
+    """
+
+    if type(val) is not int:
+        return repr(float(val))
+    if base is not None and val < 0:
+        val &= cfg.bin_max_val
+    if base in (glb.BIN, glb.OCT, glb.HEX):
+        return {glb.BIN: "{:b}", glb.OCT: "{:o}", glb.HEX: "{:X}"}[base].format(val)
+
+    limit = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+    if not limit:
+        return str(val)
+    sys.set_int_max_str_digits(0)
+    try:
+        return str(val)
+    finally:
+        sys.set_int_max_str_digits(limit)
 
 ########################################################################################
 class PrintToRpnCommand(sublime_plugin.TextCommand):
@@ -17,16 +108,21 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
     #--------------------------------------------
     def run(self, edit, **kwargs):
         stack          = kwargs['stack']
+        stack_offset   = kwargs.get('stack_offset', 0)
+        labels         = kwargs.get('labels', [])
         self.mode      = kwargs['mode']
         self.prev_mode = kwargs['prev_mode']
         self.help_str  = kwargs['help_str']
         self.base      = kwargs['base']
         self.notation  = kwargs['notation']
         self.message   = kwargs['message']
+        self.readout   = kwargs.get('readout', 0)
+        self.lanes     = kwargs.get('lanes', 0)
+        self.layout    = kwargs.get('layout')
 
-        self.ctx = Context(prec=glb.SCI_PRECISION)
+        self.ctx = cfg.sci_context
         self.erase_buffer(edit)
-        rpn_txt = self.get_rpn_txt(stack)
+        rpn_txt = self.get_rpn_txt(stack, stack_offset, labels)
         self.view.insert(edit, 0, rpn_txt)
 
     #--------------------------------------------
@@ -37,8 +133,12 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
         self.view.erase(edit, region)
 
     #--------------------------------------------
-    def get_rpn_txt(self, stack):
-        "Return the string of text that will fill the RPN window"
+    def get_rpn_txt(self, stack, stack_offset=0, labels=()):
+        """
+        Return the string of text that will fill the RPN window. Only the in-memory
+        part of the stack is shown: stack_offset values before it are on disk.
+        labels holds a label, or None, for each value in stack.
+        """
 
         if self.mode == glb.CHANGE_MODE:
             return self.get_change_mode_str()
@@ -53,6 +153,14 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
         # blank line
         str += '\n'
 
+        # the top values in every base
+        if self.mode == glb.PROGRAMMER and self.readout and stack:
+            str += self.get_readout(stack, stack_offset)
+
+        # the fields of the top value, in the register layout
+        if self.mode == glb.PROGRAMMER and self.layout and stack:
+            str += self.get_decode(stack[-1], stack_offset + len(stack) - 1)
+
         # binary bits
         if self.mode == glb.PROGRAMMER and self.base == glb.BIN:
             str += self.get_binary_bits()
@@ -61,18 +169,24 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
         if self.mode == glb.HELP:
             str += self.help_str
         else:
+            if stack_offset:
+                str += "{}..{}> (on disk)\n".format(0, stack_offset-1)
             if stack:
-                for idx, val in enumerate(stack):
-                    str += "{}> {}\n".format(idx, self.print_val(val))
+                for idx, val in enumerate(stack, stack_offset):
+                    label = labels[idx-stack_offset] if idx-stack_offset < len(labels) else None
+                    if label:
+                        str += "{}> {}  [{}]\n".format(idx, self.print_val(val), label)
+                    else:
+                        str += "{}> {}\n".format(idx, self.print_val(val))
 
-            str += "{}> ".format(len(stack))
+            str += "{}> ".format(stack_offset + len(stack))
 
         return str
 
     #--------------------------------------------
     def twos_compl(self, val):
         "Return the twos complement of the number"
-        return glb.BIN_MAX_VAL - abs(val) + 1
+        return cfg.bin_max_val - abs(val) + 1
         return val
 
     #--------------------------------------------
@@ -80,9 +194,24 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
         "Return a value as a string, based on the mode we're in"
 
         if self.mode == glb.PROGRAMMER:
-            base_char = {2: '0%db' % (glb.BIN_MAX_BITS), 8: '0%do' % (glb.BIN_MAX_BITS/3), 10: 'd', 16: '0%dX' % (glb.BIN_MAX_BITS/4)}[self.base]
-            fmt = "{:%s}" % (base_char)
+            fmt = cfg.programmer_formats[self.base]
             val = int(val) if val >= 0 else self.twos_compl(int(val))
+            if is_huge(val):
+                if self.lanes:
+                    # lanes are within bin_max_bits
+                    val &= cfg.bin_max_val
+                elif self.base == glb.DEC:
+                    val, fmt = leading_digits(val, self.ctx.prec), "{:E}"
+                else:
+                    return leading_base_digits(val, self.base, cfg.bin_max_bits)
+
+        # huge integers, in any other mode, are shown from their leading digits
+        elif is_huge(val):
+            val = leading_digits(val, self.ctx.prec)
+            if self.notation == glb.ENGINEERING:
+                val, fmt = val.to_eng_string(), "{:s}"
+            else:
+                fmt = "{:E}"
 
         # in scientific mode, values > 10,000 should be in sci notation
         elif self.mode == glb.SCIENTIFIC and abs(val) >= 10000:
@@ -96,16 +225,54 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
             fmt = "{:G}"
         val_str = fmt.format(val)
 
-        # Add underscores between nibbles in these modes
-        if self.mode == glb.PROGRAMMER and self.base in (glb.BIN, glb.OCT, glb.HEX) and len(val_str) > 4:
-            vals = []
-            while len(val_str):
-                vals.insert(0, val_str[-4:])
-                val_str = val_str[:-4]
-            val_str = '_'.join(vals)
+        # Group the digits by lane, or else add underscores between nibbles
+        if self.mode == glb.PROGRAMMER and self.lanes and self.base != glb.OCT:
+            val_str = self.group_lanes(val, val_str)
+        elif self.mode == glb.PROGRAMMER and self.base in (glb.BIN, glb.OCT, glb.HEX) and len(val_str) > 4:
+            val_str = group_digits(val_str)
 
         return val_str
 
+    #--------------------------------------------
+    def group_lanes(self, val, val_str):
+        "Split a programmer mode value into its lanes, most significant first"
+        if self.base == glb.DEC:
+            return '.'.join(str(lane) for lane in rpn_bits.lane_values(val, self.lanes, cfg.bin_max_bits))
+        digit_bits = 1 if self.base == glb.BIN else 4
+        return group_digits(val_str, self.lanes // digit_bits)
+
+    #--------------------------------------------
+    def get_readout(self, stack, stack_offset):
+        "Return the readout of the top values of the stack, in every base, as a string"
+
+        readout = ""
+        for idx in range(len(stack) - 1, max(len(stack) - self.readout, 0) - 1, -1):
+            prefix = "{}> ".format(idx + stack_offset)
+            for line in readout_lines(stack[idx], cfg.bin_max_bits):
+                readout += prefix + line + '\n'
+                prefix = ' ' * len(prefix)
+        return readout + '\n'
+
+    #--------------------------------------------
+    def get_decode(self, val, idx):
+        "Return the fields of a value in the register layout, one per line"
+
+        layout = rpn_layouts.get_layouts().get(self.layout)
+        if layout is None:
+            return ""
+
+        fields = rpn_layouts.decode(layout, int(val) & cfg.bin_max_val)
+        bits = ["[{}:{}]".format(msb, lsb) if msb != lsb else "[{}]".format(msb) for _, msb, lsb, _ in fields]
+        name_width = max(len(name) for name, _, _, _ in fields)
+        bits_width = max(len(field_bits) for field_bits in bits)
+        fmt = {glb.BIN: "0b{:b}", glb.OCT: "0o{:o}", glb.DEC: "{:d}", glb.HEX: "0x{:X}"}[self.base]
+
+        decode = "{}> {}\n".format(idx, self.layout)
+        indent = ' ' * len("{}> ".format(idx))
+        for (name, _, _, field_val), field_bits in zip(fields, bits):
+            decode += "{}{:<{}} {:<{}} = {}\n".format(indent, name, name_width, field_bits, bits_width, fmt.format(field_val))
+        return decode + '\n'
+
     #--------------------------------------------
     def get_mode_line(self):
         "Return the mode line as a string."
@@ -133,12 +300,7 @@ class PrintToRpnCommand(sublime_plugin.TextCommand):
     #--------------------------------------------
     def get_binary_bits(self):
         # present bit numbers when in binary mode
-        bit_line = "   "
-        for num in range(glb.BIN_MAX_BITS-1, 0, -8):
-            num_spaces = 8 if num > 7 else 7
-            bit_line += "%d" % num + ' '*num_spaces
-        bit_line += "0\n"
-        return bit_line
+        return cfg.bin_header
 
     #--------------------------------------------
     def get_change_mode_str(self):
@@ -10,8 +10,11 @@ __email__ = 'brian.p.hunter@gmail.com'
 __version__ = '0.4.0'
 
 
+import sublime
 import sublime_plugin
-from . import rpn_globals as glb
+from . import rpn_event
+from . import rpn_layouts
+from .rpn_settings import cfg
 
 class RpnCommand(sublime_plugin.WindowCommand):
     "Launches the rpn view"
@@ -20,13 +23,40 @@ class RpnCommand(sublime_plugin.WindowCommand):
     def run(self):
         self.opanel = None
         for aview in self.window.views():
-            if aview.name() == glb.RPN_WINDOW_NAME:
+            if aview.name() == cfg.window_name:
                 self.opanel = aview
                 break
 
         if self.opanel is None:
             self.opanel = self.window.new_file()
-            self.opanel.set_name(glb.RPN_WINDOW_NAME)
+            self.opanel.set_name(cfg.window_name)
             self.opanel.set_scratch(True)
 
+        # recover the previous session, if Sublime crashed
+        if rpn_event.RPNEvent.instance is not None:
+            rpn_event.RPNEvent.instance.open_journal()
+
         self.window.focus_view(self.opanel)
+
+########################################################################################
+class RpnSelectLayoutCommand(sublime_plugin.WindowCommand):
+    "Choose the register layout used to decode and encode values in programmer mode"
+
+    #--------------------------------------------
+    def run(self):
+        self.names = sorted(rpn_layouts.get_layouts())
+        if not self.names:
+            sublime.error_message("RPN: There are no register layouts. Add them to the register_layouts setting.")
+            return
+        self.window.show_quick_panel(self.names, self.select)
+
+    #--------------------------------------------
+    def select(self, index):
+        listener = rpn_event.RPNEvent.instance
+        if index < 0 or listener is None:
+            return
+
+        listener.select_layout(self.names[index])
+        view = self.window.active_view()
+        if view is not None and view.name() == cfg.window_name:
+            listener.update_rpn(view)
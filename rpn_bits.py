@@ -0,0 +1,237 @@
+"""
+Bit manipulation for programmer mode.
+
+Values are treated as unsigned integers of a given width (negative values as
+two's complement). Work is done a byte at a time through lookup tables, and
+masks are cached, so each operation costs a constant amount per byte.
+"""
+
+import struct
+import operator
+from functools import lru_cache
+from itertools import repeat
+
+########################################################################################
+# Lookup tables, indexed by byte value
+
+POPCOUNT_TABLE = bytes(bin(num).count('1') for num in range(256))
+REVERSE_TABLE  = bytes(int('{:08b}'.format(num)[::-1], 2) for num in range(256))
+
+########################################################################################
+# Masks
+
+#--------------------------------------------
+@lru_cache(maxsize=None)
+def width_mask(bits):
+    "A mask of the lowest bits bits"
+    return (1 << bits) - 1
+
+#--------------------------------------------
+@lru_cache(maxsize=1024)
+def field_mask(msb, lsb):
+    "A mask of the bits from msb down to lsb, inclusive"
+    if lsb < 0 or msb < lsb:
+        raise ValueError("Values must be MSB first, LSB second: x[y:z]")
+    return width_mask(msb - lsb + 1) << lsb
+
+#--------------------------------------------
+def num_bytes(bits):
+    return (bits + 7) // 8
+
+#--------------------------------------------
+def to_bytes(val, bits):
+    "Return the value, masked to bits, as little-endian bytes"
+    return (val & width_mask(bits)).to_bytes(num_bytes(bits), 'little')
+
+########################################################################################
+# Counting
+
+#--------------------------------------------
+def popcount(val, bits):
+    "Number of bits set"
+    return sum(to_bytes(val, bits).translate(POPCOUNT_TABLE))
+
+#--------------------------------------------
+def parity(val, bits):
+    "1 if an odd number of bits are set, otherwise 0"
+    return popcount(val, bits) & 1
+
+#--------------------------------------------
+def leading_zeros(val, bits):
+    "Number of zeros above the most significant set bit"
+    return bits - (val & width_mask(bits)).bit_length()
+
+#--------------------------------------------
+def trailing_zeros(val, bits):
+    "Number of zeros below the least significant set bit"
+    val &= width_mask(bits)
+    if val == 0:
+        return bits
+    return (val & -val).bit_length() - 1
+
+########################################################################################
+# Reordering
+
+#--------------------------------------------
+def bit_reverse(val, bits):
+    "Reverse the order of the bits"
+    # reversing each byte and reading them back big-endian reverses all num_bytes*8 bits
+    rev = int.from_bytes(to_bytes(val, bits).translate(REVERSE_TABLE), 'big')
+    return rev >> (num_bytes(bits) * 8 - bits)
+
+#--------------------------------------------
+def byte_swap(val, bits):
+    "Reverse the order of the bytes"
+    return int.from_bytes(to_bytes(val, bits), 'big') & width_mask(bits)
+
+#--------------------------------------------
+def rotate_left(val, count, bits):
+    count %= bits
+    val &= width_mask(bits)
+    return ((val << count) | (val >> (bits - count))) & width_mask(bits)
+
+#--------------------------------------------
+def rotate_right(val, count, bits):
+    return rotate_left(val, -count, bits)
+
+########################################################################################
+# Bit fields
+
+#--------------------------------------------
+def get_field(val, msb, lsb):
+    return (val & field_mask(msb, lsb)) >> lsb
+
+#--------------------------------------------
+def set_field(val, msb, lsb, bits):
+    return (val | field_mask(msb, lsb)) & width_mask(bits)
+
+#--------------------------------------------
+def clear_field(val, msb, lsb, bits):
+    return val & ~field_mask(msb, lsb) & width_mask(bits)
+
+#--------------------------------------------
+def toggle_field(val, msb, lsb, bits):
+    return (val ^ field_mask(msb, lsb)) & width_mask(bits)
+
+#--------------------------------------------
+def insert_field(val, field, msb, lsb, bits):
+    "Replace the bits from msb down to lsb with field"
+    mask = field_mask(msb, lsb)
+    return ((val & ~mask) | ((field << lsb) & mask)) & width_mask(bits)
+
+########################################################################################
+# Packed lanes
+#
+# A value is treated as lanes of 8, 16, or 32 bits, enough of them to cover all of
+# its bits, with lane 0 the least significant. Additions, subtractions, and
+# comparisons work on every lane at once, by keeping carries and borrows from
+# crossing out of the top bit of each lane. Lane values are unsigned.
+
+LANE_WIDTHS = (8, 16, 32)
+LANE_FORMATS = {8: 'B', 16: 'H', 32: 'I'}
+
+#--------------------------------------------
+@lru_cache(maxsize=64)
+def lane_masks(lane, bits):
+    "Returns (ones, high, full): the lowest bit, the highest bit, and all bits of every lane"
+    lanes = -(-bits // lane)
+    full = width_mask(lanes * lane)
+    ones = full // width_mask(lane)
+    return ones, ones << (lane - 1), full
+
+#--------------------------------------------
+@lru_cache(maxsize=64)
+def lane_struct(lane, bits):
+    "A struct that packs the lanes covering bits, lane 0 first"
+    return struct.Struct('<{}{}'.format(-(-bits // lane), LANE_FORMATS[lane]))
+
+#--------------------------------------------
+def lane_fill(flags, lane):
+    "Expand a flag in the highest bit of a lane into a lane of all ones"
+    return (flags >> (lane - 1)) * width_mask(lane)
+
+#--------------------------------------------
+def lane_sub_borrow(a, b, lane, bits):
+    "Returns (a-b in each lane, wrapping; the highest bit of each lane in which a < b)"
+    ones, high, full = lane_masks(lane, bits)
+    a, b = a & full, b & full
+    diff = ((a | high) - (b & ~high)) ^ ((a ^ b ^ high) & high)
+    borrow = ((~a & b) | (~(a ^ b) & diff)) & high
+    return diff & full, borrow
+
+#--------------------------------------------
+def lane_add(a, b, lane, bits, saturate=False):
+    "a+b in each lane, wrapping around, or saturating at the largest lane value"
+    ones, high, full = lane_masks(lane, bits)
+    a, b = a & full, b & full
+    total = ((a & ~high) + (b & ~high)) ^ ((a ^ b) & high)
+    if saturate:
+        carry = ((a & b) | ((a | b) & ~total)) & high
+        total |= lane_fill(carry, lane)
+    return total & width_mask(bits)
+
+#--------------------------------------------
+def lane_sub(a, b, lane, bits, saturate=False):
+    "a-b in each lane, wrapping around, or saturating at 0"
+    diff, borrow = lane_sub_borrow(a, b, lane, bits)
+    if saturate:
+        diff &= ~lane_fill(borrow, lane)
+    return diff & width_mask(bits)
+
+#--------------------------------------------
+def lane_mul(a, b, lane, bits, saturate=False):
+    "a*b in each lane, keeping the low bits of each product, or saturating"
+    fmt = lane_struct(lane, bits)
+    nbytes = fmt.size
+    full = lane_masks(lane, bits)[2]
+    products = map(operator.mul, fmt.unpack((a & full).to_bytes(nbytes, 'little')),
+                                 fmt.unpack((b & full).to_bytes(nbytes, 'little')))
+    limit = repeat(width_mask(lane))
+    products = map(min if saturate else operator.and_, products, limit)
+    return int.from_bytes(fmt.pack(*products), 'little') & width_mask(bits)
+
+#--------------------------------------------
+def lane_shift_left(val, count, lane, bits):
+    "Shift each lane left by count, dropping the bits shifted out of it"
+    ones, high, full = lane_masks(lane, bits)
+    if count >= lane:
+        return 0
+    keep = ones * ((width_mask(lane) << count) & width_mask(lane))
+    return ((val & full) << count) & keep & width_mask(bits)
+
+#--------------------------------------------
+def lane_shift_right(val, count, lane, bits):
+    "Shift each lane right by count, shifting in zeros"
+    ones, high, full = lane_masks(lane, bits)
+    if count >= lane:
+        return 0
+    return ((val & full) >> count) & (ones * (width_mask(lane) >> count)) & width_mask(bits)
+
+#--------------------------------------------
+def lane_min(a, b, lane, bits):
+    below = lane_fill(lane_sub_borrow(a, b, lane, bits)[1], lane)
+    return ((a & below) | (b & ~below)) & width_mask(bits)
+
+#--------------------------------------------
+def lane_max(a, b, lane, bits):
+    below = lane_fill(lane_sub_borrow(a, b, lane, bits)[1], lane)
+    return ((b & below) | (a & ~below)) & width_mask(bits)
+
+#--------------------------------------------
+def lane_equal(a, b, lane, bits):
+    "All ones in each lane where a equals b, otherwise zeros"
+    ones, high, full = lane_masks(lane, bits)
+    diff = (a ^ b) & full
+    nonzero = (((diff & ~high) + (full & ~high)) | diff) & high
+    return full & ~lane_fill(nonzero, lane) & width_mask(bits)
+
+#--------------------------------------------
+def lane_greater(a, b, lane, bits):
+    "All ones in each lane where a is greater than b, otherwise zeros"
+    return lane_fill(lane_sub_borrow(b, a, lane, bits)[1], lane) & width_mask(bits)
+
+#--------------------------------------------
+def lane_values(val, lane, bits):
+    "The value of each lane, most significant lane first"
+    fmt = lane_struct(lane, bits)
+    return fmt.unpack((val & lane_masks(lane, bits)[2]).to_bytes(fmt.size, 'little'))[::-1]
@@ -4,6 +4,8 @@ Decorators used by computational functions.
 
 from functools import wraps
 import sublime
+from . import rpn_globals as glb
+from . import rpn_worker
 
 ########################################################################################
 # Decorators
@@ -15,6 +17,7 @@ def pop_vals(pop_num):
         def wrapper(self):
             vals = self.pop_values(pop_num)
             func(self, vals)
+        wrapper.pop_count = pop_num
         return wrapper
     return pop_dec
 
@@ -36,6 +39,7 @@ def handle_exc(func):
             sublime.error_message("math error: {}".format(exp))
         else:
             self.stack.append(result)
+    wrapper.returns_result = True
     return wrapper
 
 #--------------------------------------------
@@ -47,4 +51,48 @@ def handle_exc_undo(func):
         except Exception as exc:
             sublime.error_message("math error: {}".format(exc))
             self.undo()
+    wrapper.returns_result = True
+    return wrapper
+
+#--------------------------------------------
+def offload(func):
+    """
+    If the result would be very large, run the computation in a worker process
+    instead of inline. The result is pushed onto the stack when the worker finishes.
+    """
+    @wraps(func)
+    def wrapper(self, vals):
+        if rpn_worker.is_expensive(func.__name__, vals, glb.WORKER_MIN_BITS):
+            self.start_job(func.__name__, vals)
+        else:
+            func(self, vals)
+    wrapper.offloaded = True
+    return wrapper
+
+########################################################################################
+# Helpers
+
+#--------------------------------------------
+def unwrap(command):
+    """
+    Returns (undecorated function, number of values popped) for a command that pops
+    a fixed number of values and returns its result, or (None, None) for any other.
+    The undecorated function takes (self, vals) and returns the result.
+    """
+
+    if not getattr(command, 'returns_result', False) or not hasattr(command, 'pop_count'):
+        return None, None
+    func = command.__func__
+    while hasattr(func, '__wrapped__'):
+        func = func.__wrapped__
+    return func, command.pop_count
+
+#--------------------------------------------
+def inline_only(func):
+    "Wrap the undecorated function of an offloaded command, refusing values that need a worker"
+    @wraps(func)
+    def wrapper(self, vals):
+        if rpn_worker.is_expensive(func.__name__, vals, glb.WORKER_MIN_BITS):
+            raise ValueError("{} is too large to compute for many values at once".format(func.__name__))
+        return func(self, vals)
     return wrapper
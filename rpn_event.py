@@ -4,14 +4,26 @@ Handles all RPN events.
 
 import sublime
 import sublime_plugin
+import os
 import math
+import itertools
 from . import rpn_globals as glb
+from . import rpn_worker
+from . import rpn_bits
+from . import rpn_journal
+from . import print_to_rpn
+from . import rpn_layouts
+from .rpn_settings import cfg
+from .rpn_stack import SpillStack, dump_stacks, load_stacks
 from .rpn_decorators import *
 
 ########################################################################################
 class RPNEvent(sublime_plugin.EventListener):
     "Handles all the work for RPN"
 
+    # the most recently created listener, for commands that push values onto the stack
+    instance = None
+
     def __init__(self):
         "Initial set-up"
 
@@ -19,8 +31,20 @@ class RPNEvent(sublime_plugin.EventListener):
 
         self.opanel = None
         self.done = False
-        self.prev_stack, self.stack = [], []
+        self.prev_stack, self.stack = [], SpillStack()
         self.additional_help = {}
+        self.job = None
+        self.stack_name = 'main'
+        self.named_stacks = {}
+        self.journal = None
+        self.replaying = False
+        self.job_pending = False
+        self.flush_scheduled = False
+        self.checkpoint_scheduled = False
+        self.prefix = None
+        self.prefix_count = None
+        self.lane_pending = False
+        RPNEvent.instance = self
 
         # Create dictionaries of commands that associate key presses with the functions they call
         fundamental_cmds = {
@@ -28,6 +52,10 @@ class RPNEvent(sublime_plugin.EventListener):
             'X': self.clear_stack,
             'S': self.swap_stack,
             'x': self.pop_last_value,
+            'N': self.next_stack,
+            'Y': self.copy_value,
+            'M': self.map_prefix,
+            'R': self.reduce_prefix,
             '?': self.help,
             ':': self.change_mode,
         }
@@ -50,7 +78,46 @@ class RPNEvent(sublime_plugin.EventListener):
             ',': self.shift_left,
             '.': self.shift_right,
             '<': self.shift_left_many,
-            '>': self.shift_right_many
+            '>': self.shift_right_many,
+            '=': self.toggle_readout,
+            ';': self.lane_prefix,
+        }
+
+        lane_cmds = {
+            '+': self.lane_add,
+            '-': self.lane_sub,
+            '*': self.lane_mul,
+            '<': self.lane_shift_left,
+            '>': self.lane_shift_right,
+            'm': self.lane_min,
+            'M': self.lane_max,
+            '=': self.lane_equal,
+            'g': self.lane_greater,
+            'w': self.lane_width,
+            's': self.lane_saturate,
+            'l': self.lane_group,
+            ';': self.lane_off,
+        }
+
+        layout_cmds = {
+            '{': self.toggle_decode,
+            '}': self.encode_layout,
+            '@': self.next_layout,
+        }
+
+        bit_cmds = {
+            '#': self.popcount,
+            'p': self.parity,
+            'L': self.leading_zeros,
+            'T': self.trailing_zeros,
+            'r': self.bit_reverse,
+            'w': self.byte_swap,
+            '[': self.rotate_left,
+            ']': self.rotate_right,
+            'o': self.set_field,
+            'z': self.clear_field,
+            't': self.toggle_field,
+            'i': self.insert_field,
         }
 
         scientific_cmds = {
@@ -95,11 +162,21 @@ class RPNEvent(sublime_plugin.EventListener):
         self.programmer_commands.update(fundamental_cmds)
         self.programmer_commands.update(basic_cmds)
         self.programmer_commands.update(programmer_cmds)
+        self.programmer_commands.update(bit_cmds)
+        self.programmer_commands.update(layout_cmds)
         self.programmer_commands_group = (('Fundamental Commands', fundamental_cmds),
                                           ('Basic Commands', basic_cmds),
                                           ('Programmer Commands', programmer_cmds),
+                                          ('Bit Manipulation Commands', bit_cmds),
+                                          ('Lane Commands (press ; first)', lane_cmds),
+                                          ('Register Layout Commands', layout_cmds),
                                           )
 
+        # after ;, the lane commands replace the programmer commands with the same keys
+        self.lane_commands = {}
+        self.lane_commands.update(self.programmer_commands)
+        self.lane_commands.update(lane_cmds)
+
         self.scientific_commands = {}
         self.scientific_commands.update(fundamental_cmds)
         self.scientific_commands.update(basic_cmds)
@@ -123,7 +200,12 @@ class RPNEvent(sublime_plugin.EventListener):
 
         # yes, undo affects the stack. But if it's not in this tuple, then it will
         # not work because it would push the current stack onto prev_stack before popping
-        self.commands_that_dont_affect_stack = (self.help, self.change_mode, self.undo)
+        self.commands_that_dont_affect_stack = (self.help, self.change_mode, self.undo, self.next_stack,
+                                                 self.toggle_readout, self.map_prefix, self.reduce_prefix,
+                                                 self.lane_prefix, self.lane_off, self.lane_width,
+                                                 self.lane_saturate, self.lane_group, self.copy_value,
+                                                 self.toggle_decode, self.next_layout, self.encode_layout)
+        self.prefix_commands = (self.map_prefix, self.reduce_prefix)
 
         self.legal_commands = {
             glb.BASIC:      self.basic_commands,
@@ -142,6 +224,12 @@ class RPNEvent(sublime_plugin.EventListener):
         self.base = glb.DEC
         self.notation = glb.REGULAR
         self.mode, self.prev_mode = glb.PROGRAMMER, glb.PROGRAMMER
+        self.readout = False
+        self.lane_bits = rpn_bits.LANE_WIDTHS[0]
+        self.saturate = False
+        self.lane_display = False
+        self.layout_name = None
+        self.decode = False
         self.help_str = None
         self.that_was_me = False
         self.edit_region_start = 0
@@ -170,7 +258,7 @@ class RPNEvent(sublime_plugin.EventListener):
     def on_activated_async(self, view):
         "Update the rpn window whenever it is activated"
 
-        if(not self.that_was_me and view.name() == glb.RPN_WINDOW_NAME):
+        if(not self.that_was_me and view.name() == cfg.window_name):
             self.update_rpn(view)
             self.that_was_me = False
 
@@ -178,12 +266,18 @@ class RPNEvent(sublime_plugin.EventListener):
     def on_close(self, view):
         "If the RPN window is closed, re-initialize all values and next time start fresh."
 
-        if(view.name() == glb.RPN_WINDOW_NAME):
+        if(view.name() == cfg.window_name):
+            if self.job is not None:
+                self.job.cancel()
+            if self.journal is not None:
+                self.journal.reset()
             self.__init__()
 
     #--------------------------------------------
     def on_modified(self, view):
-        if(view.name() == glb.RPN_WINDOW_NAME):
+        if(view.name() == cfg.window_name):
+            self.opanel = view
+            self.open_journal()
             if self.that_was_me:
                 self.that_was_me = False
                 self.edit_region_start = view.size()
@@ -194,12 +288,18 @@ class RPNEvent(sublime_plugin.EventListener):
                     self.update_rpn(view)
                     return
 
+                # while a worker is computing, any key cancels it
+                if self.job is not None:
+                    self.cancel_job()
+                    self.update_rpn(view)
+                    return
+
                 current_region = sublime.Region(self.edit_region_start, view.size())
                 text = view.substr(current_region)
 
                 # if in help mode, then remove the help and re-draw the panel
                 if self.mode == glb.HELP:
-                    self.mode = self.prev_mode
+                    self.exit_help()
                     self.update_rpn(view)
                     return
                 elif self.mode == glb.CHANGE_MODE:
@@ -209,6 +309,7 @@ class RPNEvent(sublime_plugin.EventListener):
                     except KeyError:
                         pass
                     else:
+                        self.record('m', mode_cmd.__name__)
                         mode_cmd()
                     finally:
                         self.update_rpn(view)
@@ -233,6 +334,8 @@ class RPNEvent(sublime_plugin.EventListener):
 
         args = None
         current_legal_commands = self.legal_commands[self.mode]
+        if self.lane_pending and self.mode == glb.PROGRAMMER:
+            current_legal_commands = self.lane_commands
         if key_pressed in self.get_legal_digits(text):
             return
         elif key_pressed in current_legal_commands.keys():
@@ -248,6 +351,9 @@ class RPNEvent(sublime_plugin.EventListener):
                 return
             args = (text,)
         else:
+            if self.lane_pending:
+                self.record('m', 'lane_off')
+                self.lane_off()
             self.message = "ERROR:  Illegal digit or command {}".format(key_pressed)
             return
 
@@ -260,14 +366,20 @@ class RPNEvent(sublime_plugin.EventListener):
         "Runs the print_to_rpn command"
 
         self.that_was_me = True
+        stack_offset, stack = self.stack.visible()
         try:
-            view.run_command("print_to_rpn", {'stack': self.stack,
+            view.run_command("print_to_rpn", {'stack': stack,
+                                              'stack_offset': stack_offset,
+                                              'labels': [getattr(val, 'label', None) for val in stack],
                                               'mode': self.mode,
                                               'prev_mode': self.prev_mode,
                                               'help_str': self.help_str,
                                               'base': self.base,
                                               'notation': self.notation,
-                                              'message': self.message})
+                                              'message': self.message,
+                                              'readout': cfg.readout_depth if self.readout else 0,
+                                              'lanes': self.lane_bits if self.lane_display else 0,
+                                              'layout': self.layout_name if self.decode else None})
         except Exception as exc:
             self.message = "ERROR:  Sublime exception: {}".format(exc)
 
@@ -311,8 +423,12 @@ class RPNEvent(sublime_plugin.EventListener):
     def process(self, args):
         "Take all values and commands supplied from the input and process them to create the new stack."
 
+        self.record('p', [arg if type(arg) is str else (arg.__name__,) for arg in args])
         for arg in args:
-            if type(arg) is str:
+            if type(arg) is str and arg is not args[-1] and args[-1] in self.prefix_commands:
+                # a number typed before a prefix is the count of values, not a value
+                self.prefix_count = arg
+            elif type(arg) is str:
                 try:
                     if self.mode == glb.PROGRAMMER:
                         last_val = int(arg, self.base)
@@ -325,12 +441,19 @@ class RPNEvent(sublime_plugin.EventListener):
                 except ValueError:
                     self.message = "ERROR:  Unable to convert {} to a number.".format(arg)
                 else:
-                    self.prev_stack.append(self.stack[:])
+                    self.save_undo()
                     self.stack.append(last_val)
             else:
                 try:
                     self.message = glb.BASIC_HELP
-                    self.run_command(arg)
+                    self.lane_pending = False
+                    prefix, self.prefix = self.prefix, None
+                    if prefix is not None and arg not in self.commands_that_dont_affect_stack:
+                        command = self.prefixed_command(prefix, arg)
+                        if command is not None:
+                            self.run_command(command)
+                    else:
+                        self.run_command(arg)
                 except ZeroDivisionError:
                     self.message = "ERROR:  Division by zero."
                 except:
@@ -340,11 +463,36 @@ class RPNEvent(sublime_plugin.EventListener):
     def run_command(self, command):
         try:
             if command not in self.commands_that_dont_affect_stack:
-                self.prev_stack.append(self.stack[:])
+                self.save_undo()
             command()
         except glb.InsufficientStackDepth as exc:
             self.message = "ERROR:  Not enough values for operation: {} required, but only {} available.".format(exc.required, len(self.stack))
 
+    #--------------------------------------------
+    def save_undo(self):
+        "Save a copy of the stack for undo, keeping only the newest undo_history copies"
+        self.prev_stack.append(self.stack.copy())
+        del self.prev_stack[:max(0, len(self.prev_stack) - cfg.undo_history)]
+
+    #--------------------------------------------
+    def push_values(self, values):
+        "Push many values onto the stack at once, as a single step for undo"
+
+        values = list(values)
+        self.record('v', values)
+        self.save_undo()
+        self.stack.extend(values)
+
+    #--------------------------------------------
+    def load_named_stack(self, name, stack):
+        "Replace the contents of a named stack. The current stack can be undone."
+
+        if name == self.stack_name:
+            self.save_undo()
+            self.stack = stack
+        else:
+            self.named_stacks[name] = (stack, [])
+
     #--------------------------------------------
     def pop_values(self, count):
         if count <= 0:
@@ -362,12 +510,229 @@ class RPNEvent(sublime_plugin.EventListener):
     def pop_all(self):
         "Clears and returns the entire stack"
         if len(self.stack) == 0:
-            raise glb.InsufficientStackDepth()
+            raise glb.InsufficientStackDepth(1)
 
-        vals = self.stack[:]
-        self.stack = []
+        vals = self.stack
+        self.stack = SpillStack()
         return vals
 
+    ########################################################################################
+    # Worker Jobs
+
+    #--------------------------------------------
+    def start_job(self, name, vals):
+        "Run an expensive operation in a worker process. The stack is restored by undo if it fails."
+
+        if self.replaying:
+            # the result, or the failure, is replayed from the journal
+            self.job_pending = True
+            return
+
+        self.job = rpn_worker.Job(name, vals, self.job_done, timeout=cfg.worker_timeout,
+                                  python=cfg.worker_python)
+        self.message = "Computing... any key cancels"
+        self.job.start()
+
+    #--------------------------------------------
+    def job_done(self, job, status, value):
+        "Called from the job's thread: finish the job in Sublime's main thread"
+        sublime.set_timeout(lambda: self.finish_job(job, status, value), 0)
+
+    #--------------------------------------------
+    def finish_job(self, job, status, value):
+        "Push the result of a worker job, or restore the stack if it failed"
+
+        # ignore jobs that were cancelled or abandoned when the window closed
+        if job is not self.job:
+            return
+        self.job = None
+
+        if status == 'ok':
+            self.record('r', value)
+            self.message = glb.BASIC_HELP
+            self.stack.append(value)
+        else:
+            self.record('f')
+            if status == 'timeout':
+                self.message = "ERROR:  Timed out after {:g} seconds.".format(value)
+            else:
+                self.message = glb.BASIC_HELP
+                sublime.error_message("math error: {}".format(value))
+            self.undo()
+
+        if self.opanel is not None:
+            self.update_rpn(self.opanel)
+
+    #--------------------------------------------
+    def cancel_job(self):
+        "Kill the running worker job and restore the stack"
+
+        job, self.job = self.job, None
+        job.cancel()
+        self.record('f')
+        self.message = "Cancelled."
+        self.undo()
+
+    ########################################################################################
+    # Journal
+
+    #--------------------------------------------
+    def open_journal(self):
+        "Open the journal, first rebuilding the session in it if RPN was not closed cleanly"
+
+        if self.journal is not None or not cfg.journal:
+            return
+
+        self.journal = rpn_journal.Journal(os.path.join(sublime.cache_path(), 'RPN'),
+                                           batch_size=cfg.journal_batch,
+                                           checkpoint_every=cfg.journal_checkpoint)
+        state, records = self.journal.recover()
+        if state is not None or records:
+            self.replay(state, records)
+            if state is not None:
+                # close the checkpoint file, so that the next checkpoint can replace it
+                state.close()
+            self.message = "Recovered previous session"
+            self.checkpoint()
+
+    #--------------------------------------------
+    def record(self, *record):
+        "Append a record to the journal. It is written to disk in batches, or within a second."
+
+        if self.journal is None or self.replaying:
+            return
+
+        self.journal.append(record)
+        if self.journal.needs_checkpoint:
+            # records are written before they are applied: checkpoint once this one has been
+            if not self.checkpoint_scheduled:
+                self.checkpoint_scheduled = True
+                sublime.set_timeout(self.scheduled_checkpoint, glb.CHECKPOINT_WAIT)
+        elif self.journal.batch_full:
+            # write the batch now, but never fsync on the main thread
+            sublime.set_timeout_async(self.journal.flush, 0)
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            sublime.set_timeout_async(self.flush_journal, glb.JOURNAL_DELAY)
+
+    #--------------------------------------------
+    def flush_journal(self):
+        self.flush_scheduled = False
+        if self.journal is not None:
+            self.journal.flush()
+
+    #--------------------------------------------
+    def checkpoint(self):
+        "Save the whole state in Sublime's async thread, so that the journal can start over"
+
+        journal = self.journal
+        if journal is None:
+            return
+        token = journal.begin_checkpoint()
+        if token is not None:
+            parts = self.get_state()
+            sublime.set_timeout_async(lambda: journal.write_checkpoint(token, parts), 0)
+
+    #--------------------------------------------
+    def scheduled_checkpoint(self):
+        self.checkpoint_scheduled = False
+        self.checkpoint()
+
+    #--------------------------------------------
+    def get_state(self):
+        """
+        Return an iterator of the parts of a checkpoint: the state of the session, then
+        the stacks and their undo history. The stacks are copied, so that the parts can
+        be generated in another thread while the session goes on.
+        """
+
+        stacks = dict(self.named_stacks)
+        stacks[self.stack_name] = (self.stack, self.prev_stack)
+        names, copies = [], []
+        for name, (stack, prev_stack) in stacks.items():
+            # the whole undo history (at most undo_history steps), so that undos replayed
+            # from the journal reach as far back as they did in the session
+            names.append((name, len(prev_stack)))
+            copies.append(stack.copy())
+            copies.extend(prev.copy() for prev in prev_stack)
+
+        state = {
+            'mode':        self.mode,
+            'prev_mode':   self.prev_mode,
+            'base':        self.base,
+            'notation':    self.notation,
+            'readout':     self.readout,
+            'prefix':      self.prefix,
+            'lanes':       (self.lane_pending, self.lane_bits, self.saturate, self.lane_display),
+            'layout':      (self.layout_name, self.decode),
+            'stack_name':  self.stack_name,
+            'job_pending': self.job is not None or self.job_pending,
+            'stacks':      names,
+        }
+        return itertools.chain([state], dump_stacks(copies))
+
+    #--------------------------------------------
+    def set_state(self, parts):
+        "Restore the state saved by get_state, from an iterator of its parts"
+
+        state = next(parts)
+        self.mode, self.prev_mode = state['mode'], state['prev_mode']
+        if self.mode in (glb.HELP, glb.CHANGE_MODE):
+            self.mode = self.prev_mode
+        self.base, self.notation = state['base'], state['notation']
+        self.readout = state.get('readout', False)
+        self.prefix = state.get('prefix')
+        self.lane_pending, self.lane_bits, self.saturate, self.lane_display = \
+            state.get('lanes', (False, rpn_bits.LANE_WIDTHS[0], False, False))
+        self.layout_name, self.decode = state.get('layout', (None, False))
+        self.job_pending = state['job_pending']
+
+        self.named_stacks = {}
+        stacks = load_stacks(parts, sum(undos + 1 for _, undos in state['stacks']))
+        for name, undos in state['stacks']:
+            stack = next(stacks)
+            self.named_stacks[name] = (stack, [next(stacks) for _ in range(undos)])
+        self.stack_name = state['stack_name']
+        self.stack, self.prev_stack = self.named_stacks.pop(self.stack_name)
+
+    #--------------------------------------------
+    def replay(self, state, records):
+        "Rebuild a session from the parts of a checkpoint (or None) and the journal records written since"
+
+        self.replaying = True
+        try:
+            if state is not None:
+                self.set_state(state)
+            for record in records:
+                self.apply_record(record)
+
+            # a worker job was running when RPN stopped
+            if self.job_pending:
+                self.job_pending = False
+                self.undo()
+        finally:
+            self.replaying = False
+
+    #--------------------------------------------
+    def apply_record(self, record):
+        "Repeat what was done when the journal record was written"
+
+        kind = record[0]
+        if kind == 'p':
+            self.process([arg if type(arg) is str else getattr(self, arg[0]) for arg in record[1]])
+        elif kind == 'm':
+            getattr(self, record[1])()
+        elif kind == 'v':
+            self.push_values(record[1])
+        elif kind == 'r':
+            self.job_pending = False
+            self.stack.append(record[1])
+        elif kind == 'f':
+            self.job_pending = False
+            self.undo()
+        elif kind == 'l':
+            self.select_layout(record[1])
+
     ########################################################################################
     # Fundamental Commands
 
@@ -392,6 +757,12 @@ class RPNEvent(sublime_plugin.EventListener):
             self.help_str = self.gen_help_str()
         self.mode = glb.HELP
 
+    #--------------------------------------------
+    def exit_help(self):
+        "Any key exits the help screen."
+        self.record('m', 'exit_help')
+        self.mode = self.prev_mode
+
     #--------------------------------------------
     def undo(self):
         "Undo: Retrieves previous stack"
@@ -404,7 +775,7 @@ class RPNEvent(sublime_plugin.EventListener):
     #--------------------------------------------
     def clear_stack(self):
         "Clear the stack"
-        self.stack = []
+        self.stack = SpillStack()
 
     #--------------------------------------------
     @pop_vals(2)
@@ -417,6 +788,128 @@ class RPNEvent(sublime_plugin.EventListener):
         "Pop the last value from the stack and discards it"
         self.pop_values(1)
 
+    #--------------------------------------------
+    def next_stack(self):
+        "Next stack: Switch to the next named stack"
+        if not self.named_stacks:
+            self.message = "ERROR:  No other stacks."
+            return
+
+        names = sorted(self.named_stacks)
+        following = [name for name in names if name > self.stack_name]
+        name = following[0] if following else names[0]
+
+        self.named_stacks[self.stack_name] = (self.stack, self.prev_stack)
+        self.stack, self.prev_stack = self.named_stacks.pop(name)
+        self.stack_name = name
+        self.message = "Stack: {}".format(name)
+
+    #--------------------------------------------
+    def copy_value(self):
+        "Copy: Copy the last value to the clipboard, with every digit"
+        if len(self.stack) == 0:
+            self.message = "ERROR:  No value to copy."
+            return
+
+        if self.replaying:
+            # the clipboard may have changed since, and is not part of the session
+            return
+
+        base = self.base if self.mode == glb.PROGRAMMER else None
+        digits = print_to_rpn.full_digits(self.stack[-1], base)
+        sublime.set_clipboard(digits)
+        self.message = "Copied {} characters".format(len(digits))
+
+    #--------------------------------------------
+    def map_prefix(self):
+        "Map: Apply the next command to every value (NM: the top N). x*y and such use x for each."
+        self.set_prefix('map')
+
+    #--------------------------------------------
+    def reduce_prefix(self):
+        "Reduce: Fold the next two-value command over every value (NR: the top N)"
+        self.set_prefix('reduce')
+
+    #--------------------------------------------
+    def set_prefix(self, kind):
+        "Wait for the command to map or reduce, over the number of values typed before the prefix"
+
+        count, self.prefix_count = self.prefix_count, None
+        if count is not None:
+            try:
+                count = int(count, self.base if self.mode == glb.PROGRAMMER else 10)
+            except ValueError:
+                self.message = "ERROR:  Unable to convert {} to a count.".format(count)
+                return
+            if count < 1:
+                self.message = "ERROR:  Count must be at least 1."
+                return
+
+        self.prefix = (kind, count)
+        self.message = "{}: Press a command to apply to {}.".format(
+            kind.capitalize(), "every value" if count is None else "the top {} values".format(count))
+
+    #--------------------------------------------
+    def prefixed_command(self, prefix, command):
+        "Returns a function that maps or reduces command, or None if it cannot be"
+
+        kind, count = prefix
+        func, pop_count = unwrap(command)
+        if getattr(command, 'offloaded', False):
+            func = inline_only(func)
+        if kind == 'map' and pop_count in (1, 2):
+            return lambda: self.map_values(func, pop_count, count)
+        if kind == 'reduce' and pop_count == 2:
+            return lambda: self.reduce_values(func, count)
+        self.message = "ERROR:  Cannot {} {}.".format(kind, command.__name__)
+        return None
+
+    #--------------------------------------------
+    def prefixed_values(self, count):
+        "Pop the values for a map or reduce, oldest first: count of them, or the whole stack"
+        if count is None:
+            return self.pop_all()
+        return self.pop_values(count)[::-1]
+
+    #--------------------------------------------
+    def map_values(self, func, pop_count, count):
+        """
+        Apply func to each value in one pass. A two-value func is given the top of the
+        stack as its other operand, so that 2M* doubles every value.
+        """
+
+        try:
+            operand = self.pop_values(1) if pop_count == 2 else []
+            vals = self.prefixed_values(count)
+            results = (func(self, operand + [val]) for val in vals)
+            if count is None:
+                self.stack = SpillStack(results)
+            else:
+                self.stack.extend(list(results))
+        except glb.InsufficientStackDepth:
+            self.undo()
+            raise
+        except Exception as exc:
+            sublime.error_message("math error: {}".format(exc))
+            self.undo()
+
+    #--------------------------------------------
+    def reduce_values(self, func, count):
+        "Fold func over the values, from the oldest: +, for example, sums them"
+
+        try:
+            vals = iter(self.prefixed_values(count))
+            result = next(vals)
+            for val in vals:
+                result = func(self, [val, result])
+            self.stack.append(result)
+        except glb.InsufficientStackDepth:
+            self.undo()
+            raise
+        except Exception as exc:
+            sublime.error_message("math error: {}".format(exc))
+            self.undo()
+
     ########################################################################################
     # Basic Commands
 
@@ -475,13 +968,8 @@ class RPNEvent(sublime_plugin.EventListener):
         if vals[0] > vals[1]:
             self.message = "Values must be MSB first, LSB second: x[y:z]"
 
-        diff = vals[1] - vals[0]
-        mask = 1
-        for n in range(diff):
-            mask <<= 1
-            mask |= 1
-
-        return (vals[2] >> vals[0]) & mask
+        diff = max(vals[1] - vals[0], 0)
+        return (vals[2] >> vals[0]) & rpn_bits.width_mask(diff + 1)
 
     #--------------------------------------------
     @pop_vals(1)
@@ -501,11 +989,12 @@ class RPNEvent(sublime_plugin.EventListener):
 
     #--------------------------------------------
     @pop_vals(2)
+    @offload
     @handle_exc
     def shift_left_many(self, vals):
         "Shift left: x << y"
         self.message = "x << y"
-        return vals[1] << vals[0]
+        return rpn_worker.shift_left_many(vals)
 
     #--------------------------------------------
     @pop_vals(2)
@@ -545,27 +1034,293 @@ class RPNEvent(sublime_plugin.EventListener):
     def not_func(self, vals):
         "Bitwise NOT: ~x"
         self.message = "~x"
-        mask = int('1' * glb.BIN_MAX_BITS, base=2)
-        return(~int(vals[0]) & mask)
+        return(~int(vals[0]) & cfg.bin_max_val)
+
+    #--------------------------------------------
+    def toggle_readout(self):
+        "Readout: Show or hide the top of the stack in every base"
+        self.readout = not self.readout
+
+    #--------------------------------------------
+    def lane_prefix(self):
+        "Lanes: Apply the next command to each lane of the values"
+        self.lane_pending = True
+        self.message = "Lanes: {}-bit, {}. Press a lane command.".format(
+            self.lane_bits, "saturating" if self.saturate else "wrapping")
+
+    #--------------------------------------------
+    def lane_off(self):
+        "Lanes off: Cancel the lane prefix"
+        self.lane_pending = False
+        self.message = glb.BASIC_HELP
+
+    ########################################################################################
+    # Lane Commands
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_add(self, vals):
+        "Lane add: x+y in each lane"
+        self.message = "x + y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_add(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits, self.saturate)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_sub(self, vals):
+        "Lane subtract: x-y in each lane"
+        self.message = "x - y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_sub(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits, self.saturate)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_mul(self, vals):
+        "Lane multiply: x*y in each lane"
+        self.message = "x * y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_mul(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits, self.saturate)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_shift_left(self, vals):
+        "Lane shift left: each lane of x << y"
+        self.message = "x << y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_shift_left(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_shift_right(self, vals):
+        "Lane shift right: each lane of x >> y"
+        self.message = "x >> y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_shift_right(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_min(self, vals):
+        "Lane minimum: the smaller of x and y in each lane"
+        self.message = "min(x, y) in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_min(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_max(self, vals):
+        "Lane maximum: the larger of x and y in each lane"
+        self.message = "max(x, y) in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_max(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_equal(self, vals):
+        "Lane compare: all ones in each lane where x == y"
+        self.message = "x == y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_equal(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def lane_greater(self, vals):
+        "Lane compare: all ones in each lane where x > y"
+        self.message = "x > y in {}-bit lanes".format(self.lane_bits)
+        return rpn_bits.lane_greater(int(vals[1]), int(vals[0]), self.lane_bits, cfg.bin_max_bits)
+
+    #--------------------------------------------
+    def lane_width(self):
+        "Lane width: Switch between 8, 16, and 32-bit lanes"
+        widths = rpn_bits.LANE_WIDTHS
+        self.lane_bits = widths[(widths.index(self.lane_bits) + 1) % len(widths)]
+        self.message = "Lanes: {}-bit".format(self.lane_bits)
+
+    #--------------------------------------------
+    def lane_saturate(self):
+        "Saturate: Switch lane add, subtract, and multiply between wrapping and saturating"
+        self.saturate = not self.saturate
+        self.message = "Lanes: {}".format("saturating" if self.saturate else "wrapping")
+
+    #--------------------------------------------
+    def lane_group(self):
+        "Group: Show or hide values split into lanes"
+        self.lane_display = not self.lane_display
+
+    ########################################################################################
+    # Register Layout Commands
+
+    #--------------------------------------------
+    def current_layout(self):
+        "Returns the compiled register layout in use, or None if there are none"
+
+        layouts = rpn_layouts.get_layouts()
+        if not layouts:
+            self.message = "ERROR:  No register_layouts in the settings."
+            return None
+        if self.layout_name not in layouts:
+            self.layout_name = sorted(layouts)[0]
+        return layouts[self.layout_name]
+
+    #--------------------------------------------
+    def select_layout(self, name):
+        "Use the named register layout"
+        self.record('l', name)
+        self.layout_name = name
+        self.message = "Layout: {}".format(name)
+
+    #--------------------------------------------
+    def next_layout(self):
+        "Layout: Switch to the next register layout"
+        if self.current_layout() is None:
+            return
+
+        names = sorted(rpn_layouts.get_layouts())
+        following = [name for name in names if name > self.layout_name]
+        self.layout_name = following[0] if following else names[0]
+        self.message = "Layout: {}".format(self.layout_name)
+
+    #--------------------------------------------
+    def toggle_decode(self):
+        "Decode: Show or hide the fields of the last value in the register layout"
+        if self.decode or self.current_layout() is not None:
+            self.decode = not self.decode
+
+    #--------------------------------------------
+    def encode_layout(self):
+        "Encode: Assemble a value from its fields, pushed most significant first"
+        layout = self.current_layout()
+        if layout is not None:
+            # not saved for undo by run_command, so that there is no step to undo without a layout
+            self.save_undo()
+            self.encode_fields(self.pop_values(len(layout)))
+
+    #--------------------------------------------
+    @handle_exc_undo
+    def encode_fields(self, vals):
+        self.message = "Encoded {}".format(self.layout_name)
+        return rpn_layouts.encode(self.current_layout(), vals)
+
+    ########################################################################################
+    # Bit Manipulation Commands
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def popcount(self, vals):
+        "Population count: Number of bits set in x"
+        self.message = "popcount(x)"
+        return rpn_bits.popcount(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def parity(self, vals):
+        "Parity: 1 if an odd number of bits are set in x"
+        self.message = "parity(x)"
+        return rpn_bits.parity(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def leading_zeros(self, vals):
+        "Count leading zeros of x"
+        self.message = "clz(x)"
+        return rpn_bits.leading_zeros(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def trailing_zeros(self, vals):
+        "Count trailing zeros of x"
+        self.message = "ctz(x)"
+        return rpn_bits.trailing_zeros(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def bit_reverse(self, vals):
+        "Bit reverse: Reverse the order of the bits of x"
+        self.message = "reverse(x)"
+        return rpn_bits.bit_reverse(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(1)
+    @handle_exc
+    def byte_swap(self, vals):
+        "Byte swap: Reverse the order of the bytes of x"
+        self.message = "bswap(x)"
+        return rpn_bits.byte_swap(int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def rotate_left(self, vals):
+        "Rotate left: x rotated left by y"
+        self.message = "x rotl y"
+        return rpn_bits.rotate_left(int(vals[1]), int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(2)
+    @handle_exc
+    def rotate_right(self, vals):
+        "Rotate right: x rotated right by y"
+        self.message = "x rotr y"
+        return rpn_bits.rotate_right(int(vals[1]), int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(3)
+    @handle_exc_undo
+    def set_field(self, vals):
+        "Set field of bits: x[y:z] = 1s"
+        self.message = "x[y:z] = 1s"
+        return rpn_bits.set_field(int(vals[2]), int(vals[1]), int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(3)
+    @handle_exc_undo
+    def clear_field(self, vals):
+        "Clear field of bits: x[y:z] = 0s"
+        self.message = "x[y:z] = 0s"
+        return rpn_bits.clear_field(int(vals[2]), int(vals[1]), int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(3)
+    @handle_exc_undo
+    def toggle_field(self, vals):
+        "Toggle field of bits: x[y:z] = ~x[y:z]"
+        self.message = "x[y:z] = ~x[y:z]"
+        return rpn_bits.toggle_field(int(vals[2]), int(vals[1]), int(vals[0]), cfg.bin_max_bits)
+
+    #--------------------------------------------
+    @pop_vals(4)
+    @handle_exc_undo
+    def insert_field(self, vals):
+        "Insert field of bits: x[y:z] = w"
+        self.message = "x[y:z] = w"
+        return rpn_bits.insert_field(int(vals[3]), int(vals[0]), int(vals[2]), int(vals[1]),
+                                     cfg.bin_max_bits)
 
     ########################################################################################
     # Scientific Commands
 
     #--------------------------------------------
     @pop_vals(2)
+    @offload
     @handle_exc
     def exponent(self, vals):
         "Exponent: Computes x^y"
         self.message = "x^y"
-        return math.pow(vals[1], vals[0])
+        return rpn_worker.exponent(vals)
 
     #--------------------------------------------
     @pop_vals(1)
+    @offload
     @handle_exc
     def factorial(self, vals):
         "Factorial: Find x!"
         self.message = "x!"
-        return math.factorial(vals[0])
+        return rpn_worker.factorial(vals)
 
     #--------------------------------------------
     @pop_vals(1)
@@ -0,0 +1,41 @@
+"""
+Exports the RPN stack to a new view, with every digit of every value.
+
+Huge integers are only shown from their leading digits in the RPN view. Their
+full digits are produced here, in Sublime's async thread, since that can take
+a while.
+"""
+
+import sublime
+import sublime_plugin
+from . import rpn_globals as glb
+from . import rpn_event
+from . import print_to_rpn
+
+########################################################################################
+class RpnExportStackCommand(sublime_plugin.WindowCommand):
+    "Open a new view holding every value on the stack, oldest first, one per line"
+
+    #--------------------------------------------
+    def run(self):
+        listener = rpn_event.RPNEvent.instance
+        if listener is None or len(listener.stack) == 0:
+            sublime.error_message("RPN: The stack is empty.")
+            return
+
+        stack = listener.stack.copy()
+        base = listener.base if listener.mode == glb.PROGRAMMER else None
+        sublime.status_message("RPN: exporting {} values...".format(len(stack)))
+        sublime.set_timeout_async(lambda: self.export(stack, base), 0)
+
+    #--------------------------------------------
+    def export(self, stack, base):
+        "Runs in Sublime's async thread"
+        text = '\n'.join(print_to_rpn.full_digits(val, base) for val in stack) + '\n'
+        sublime.set_timeout(lambda: self.show(text), 0)
+
+    #--------------------------------------------
+    def show(self, text):
+        view = self.window.new_file()
+        view.set_name("RPN Stack")
+        view.run_command("append", {"characters": text})
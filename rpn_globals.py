@@ -2,22 +2,18 @@
 Global variables for RPN.
 """
 
-########################################################################################
-# Constants that users may change
-# TODO: Make these settings
-RPN_WINDOW_NAME = ">> rpn <<"
-BIN_MAX_BITS    = 48
-SCI_PRECISION   = 10
-
 ########################################################################################
 # Constants that should not be touched
 BASES           = (BIN, OCT, DEC, HEX) = (2, 8, 10, 16)
 MODES           = (BASIC, PROGRAMMER, SCIENTIFIC, STATS, HELP, CHANGE_MODE) = range(6)
 NOTATIONS       = (REGULAR, ENGINEERING) = range(2)
-BIN_MAX_VAL     = int('1'*BIN_MAX_BITS, base=2)
 MODE_BAR        = ".....{:.<15s}...{:.>5s}......"
 MESSAGE_BAR     = "{:>34s}"
 BASIC_HELP      = "? - Help"
+WORKER_MIN_BITS = 1 << 20   # operations with larger results run in a worker process
+HUGE_INT_BITS   = 1000      # larger integers are shown from their leading digits only
+JOURNAL_DELAY   = 1000      # milliseconds before buffered journal records are written
+CHECKPOINT_WAIT = 1         # milliseconds before a checkpoint, once its record is applied
 
 ########################################################################################
 class InsufficientStackDepth(Exception):
@@ -0,0 +1,188 @@
+"""
+Imports columns of a CSV file into RPN.
+
+The sum, avg, median, and stddev of each column are pushed onto the stack as
+labeled values. The file is parsed once; large files are split into byte
+ranges, parsed in parallel worker processes, and their columns are then
+aggregated in parallel as well. Each column may also be loaded into a stack
+of its own.
+"""
+
+import os
+import csv
+import multiprocessing
+from array import array
+import sublime
+import sublime_plugin
+from . import rpn_worker
+from . import rpn_event
+from .rpn_settings import cfg
+from .rpn_stack import Labeled, SpillStack
+
+AGGREGATES = ('sum', 'avg', 'median', 'stddev')
+
+#--------------------------------------------
+def sniff(path):
+    "Returns (delimiter, column names, has_header) for a CSV file"
+
+    with open(path, newline='') as ifile:
+        sample = ifile.read(64 * 1024)
+
+    sniffer = csv.Sniffer()
+    try:
+        delimiter = sniffer.sniff(sample, delimiters=',;\t| ').delimiter
+    except csv.Error:
+        delimiter = ','
+    try:
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        has_header = False
+
+    first_row = next(csv.reader(sample.splitlines(), delimiter=delimiter), [])
+    if has_header:
+        names = [name.strip() or "col{}".format(idx) for idx, name in enumerate(first_row)]
+    else:
+        names = ["col{}".format(idx) for idx in range(len(first_row))]
+    return delimiter, names, has_header
+
+#--------------------------------------------
+def is_parallel(size):
+    "Returns True if a file of size bytes is large enough to be imported in worker processes"
+    return size >= cfg.import_parallel_bytes and multiprocessing.cpu_count() > 1
+
+#--------------------------------------------
+def check_results(results):
+    "Raises ValueError if any of the results of run_jobs is not 'ok'"
+    for status, result in results:
+        if status == 'timeout':
+            raise ValueError("timed out after {:g} seconds".format(result))
+        elif status != 'ok':
+            raise ValueError(result or status)
+
+#--------------------------------------------
+def read_columns(path, indexes, delimiter, has_header):
+    """
+    Parse the file once, returning an array of the numeric values of each column in
+    indexes. Large files are split into one byte range per CPU, parsed in parallel
+    worker processes (inline on a single CPU). Raises ValueError if a worker fails.
+    """
+
+    size = os.path.getsize(path)
+    if not is_parallel(size):
+        results = [('ok', rpn_worker.read_columns((path, 0, size, delimiter, indexes, has_header)))]
+    else:
+        step = -(-size // multiprocessing.cpu_count())
+        vals_list = [(path, start, min(start + step, size), delimiter, indexes, has_header)
+                     for start in range(0, size, step)]
+        results = rpn_worker.run_jobs('read_columns', vals_list, timeout=cfg.import_timeout,
+                                      python=cfg.worker_python)
+
+    check_results(results)
+    columns = [array('d') for _ in indexes]
+    for _, result in results:
+        for column, data in zip(columns, result):
+            column.frombytes(data)
+    return columns
+
+#--------------------------------------------
+def aggregate_columns(columns, parallel):
+    """
+    Returns the column_stats of each column. If parallel, the columns are aggregated
+    in worker processes, one column per job. Raises ValueError if a worker fails.
+    """
+
+    if not parallel or len(columns) < 2:
+        return [rpn_worker.column_stats(column) for column in columns]
+
+    results = rpn_worker.run_jobs('aggregate_column', [(column.tobytes(),) for column in columns],
+                                  timeout=cfg.import_timeout, python=cfg.worker_python)
+    check_results(results)
+    return [result for _, result in results]
+
+########################################################################################
+class RpnImportColumnsCommand(sublime_plugin.WindowCommand):
+    """
+    Import the numeric columns of a CSV file: the current file, unless path is given.
+    columns may limit the import to a list of column names or indexes. If named_stacks
+    is true, each column is also loaded into its own stack (press N to switch stacks).
+    """
+
+    #--------------------------------------------
+    def run(self, path=None, columns=None, named_stacks=False):
+        self.columns = columns
+        self.named_stacks = named_stacks
+        if path is None:
+            view = self.window.active_view()
+            path = view.file_name() if view is not None else None
+        if path is None:
+            self.window.show_input_panel("CSV file:", "", self.start, None, None)
+        else:
+            self.start(path)
+
+    #--------------------------------------------
+    def start(self, path):
+        path = os.path.expanduser(path.strip())
+        if not os.path.isfile(path):
+            sublime.error_message("RPN: {} is not a file.".format(path))
+            return
+
+        sublime.status_message("RPN: importing {}...".format(os.path.basename(path)))
+        sublime.set_timeout_async(lambda: self.import_file(path), 0)
+
+    #--------------------------------------------
+    def import_file(self, path):
+        "Runs in Sublime's async thread"
+
+        try:
+            delimiter, names, has_header = sniff(path)
+        except (OSError, UnicodeDecodeError) as exc:
+            sublime.error_message("RPN: unable to read {}: {}".format(path, exc))
+            return
+
+        indexes = list(range(len(names)))
+        if self.columns:
+            try:
+                indexes = [names.index(col) if col in names else int(col) for col in self.columns]
+            except ValueError:
+                sublime.error_message("RPN: columns must be names or indexes of {}".format(names))
+                return
+
+        try:
+            columns = read_columns(path, indexes, delimiter, has_header)
+            aggregates = aggregate_columns(columns, is_parallel(os.path.getsize(path)))
+        except (OSError, csv.Error, ValueError) as exc:
+            sublime.error_message("RPN: unable to import {}: {}".format(path, exc))
+            return
+
+        values, stacks = [], []
+        for idx, column, result in zip(indexes, columns, aggregates):
+            if result['count']:
+                values.extend(Labeled(result[agg], "{} {}".format(names[idx], agg)) for agg in AGGREGATES)
+                if self.named_stacks:
+                    stacks.append((names[idx], SpillStack(column)))
+
+        sublime.set_timeout(lambda: self.push(values, stacks), 0)
+
+    #--------------------------------------------
+    def push(self, values, stacks):
+        "Push the results onto the RPN stack, and show it"
+
+        self.window.run_command("rpn")
+        listener = rpn_event.RPNEvent.instance
+        if listener is None:
+            return
+
+        listener.record('m', 'mode_stats')
+        listener.mode_stats()
+        for name, stack in stacks:
+            listener.load_named_stack(name, stack)
+        if stacks:
+            # named stacks are not journaled, so save them in a checkpoint
+            listener.checkpoint()
+        if values:
+            listener.push_values(values)
+        listener.message = "Imported {} columns".format(len(values) // len(AGGREGATES))
+
+        view = self.window.active_view()
+        if view is not None and view.name() == cfg.window_name:
+            listener.update_rpn(view)
@@ -0,0 +1,159 @@
+"""
+Ingests hex dumps and raw binary files into programmer mode.
+
+The dump is decoded in bulk into words of a chosen size and endianness, which
+are pushed onto the stack in a single step, masked to bin_max_bits. Hex may be
+plain (with or without spaces, underscores, or 0x prefixes) or the output of xxd.
+"""
+
+import os
+import re
+import mmap
+import struct
+import sublime
+import sublime_plugin
+from . import rpn_event
+from .rpn_settings import cfg
+
+WORD_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+ENDIAN = {'little': '<', 'big': '>'}
+
+XXD_OFFSET = re.compile(r'^\s*[0-9a-fA-F]+:\s')
+XXD_ASCII = re.compile(r'\s{2,}')
+NOT_HEX = re.compile(r'0[xX]|[\s_,;]')
+
+#--------------------------------------------
+def hex_to_bytes(text):
+    "Decode plain hex, or the output of xxd, into bytes"
+
+    lines = []
+    for line in text.splitlines():
+        match = XXD_OFFSET.match(line)
+        if match:
+            # drop the offset, and the ASCII column that follows the hex after two spaces
+            line = XXD_ASCII.split(line[match.end():].strip(), 1)[0]
+        lines.append(line)
+    return bytes.fromhex(NOT_HEX.sub('', ''.join(lines)))
+
+#--------------------------------------------
+def unpack_words(data, word_bytes, endian):
+    """
+    Decode a bytes-like object into words of word_bytes each, masked to bin_max_bits.
+    Returns (list of words, number of trailing bytes too few to fill a word).
+    """
+
+    count = len(data) // word_bytes
+    if word_bytes in WORD_FORMATS:
+        fmt = struct.Struct("{}{}{}".format(ENDIAN[endian], count, WORD_FORMATS[word_bytes]))
+        words = list(fmt.unpack_from(data))
+    else:
+        view = memoryview(data)
+        words = [int.from_bytes(view[idx:idx+word_bytes], endian) for idx in range(0, count * word_bytes, word_bytes)]
+        view.release()
+
+    if word_bytes * 8 > cfg.bin_max_bits:
+        words = [word & cfg.bin_max_val for word in words]
+    return words, len(data) - count * word_bytes
+
+#--------------------------------------------
+def read_raw_words(path, word_bytes, endian):
+    "Decode a binary file through a memory map, without reading it into memory first"
+
+    with open(path, 'rb') as ifile:
+        if os.fstat(ifile.fileno()).st_size == 0:
+            return [], 0
+        data = mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return unpack_words(data, word_bytes, endian)
+        finally:
+            data.close()
+
+########################################################################################
+class RpnIngestCommand(sublime_plugin.WindowCommand):
+    """
+    Push the words of a dump onto the stack in programmer mode: the hex selected in the
+    current view, or else the file at path. With raw true, the file is read as binary
+    instead of hex. word_bytes and endian ("little" or "big") default to the
+    ingest_word_bytes and ingest_endian settings.
+    """
+
+    #--------------------------------------------
+    def run(self, path=None, raw=False, word_bytes=None, endian=None):
+        self.raw = raw
+        self.word_bytes = word_bytes or cfg.ingest_word_bytes
+        self.endian = endian or cfg.ingest_endian
+        if self.word_bytes < 1 or self.endian not in ENDIAN:
+            sublime.error_message("RPN: word_bytes must be at least 1, and endian must be little or big.")
+            return
+
+        if path is None and not raw:
+            text = self.selected_text()
+            if text.strip():
+                decode = lambda: unpack_words(hex_to_bytes(text), self.word_bytes, self.endian)
+                sublime.set_timeout_async(lambda: self.ingest(decode, "selection"), 0)
+                return
+
+        if path is None:
+            self.window.show_input_panel("Binary file:" if raw else "Hex dump file:", "", self.start, None, None)
+        else:
+            self.start(path)
+
+    #--------------------------------------------
+    def selected_text(self):
+        view = self.window.active_view()
+        if view is None or view.name() == cfg.window_name:
+            return ""
+        return '\n'.join(view.substr(region) for region in view.sel() if not region.empty())
+
+    #--------------------------------------------
+    def start(self, path):
+        path = os.path.expanduser(path.strip())
+        if not os.path.isfile(path):
+            sublime.error_message("RPN: {} is not a file.".format(path))
+            return
+
+        sublime.status_message("RPN: ingesting {}...".format(os.path.basename(path)))
+        if self.raw:
+            decode = lambda: read_raw_words(path, self.word_bytes, self.endian)
+        else:
+            decode = lambda: self.read_hex_words(path)
+        sublime.set_timeout_async(lambda: self.ingest(decode, os.path.basename(path)), 0)
+
+    #--------------------------------------------
+    def read_hex_words(self, path):
+        with open(path) as ifile:
+            return unpack_words(hex_to_bytes(ifile.read()), self.word_bytes, self.endian)
+
+    #--------------------------------------------
+    def ingest(self, decode, source):
+        "Runs in Sublime's async thread. decode returns (words, number of leftover bytes)."
+
+        try:
+            words, leftover = decode()
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            sublime.error_message("RPN: unable to ingest {}: {}".format(source, exc))
+            return
+
+        message = "Ingested {} {}-byte words from {}".format(len(words), self.word_bytes, source)
+        if leftover:
+            message += " ({} trailing bytes ignored)".format(leftover)
+        sublime.set_timeout(lambda: self.push(words, message), 0)
+
+    #--------------------------------------------
+    def push(self, words, message):
+        "Push the words onto the RPN stack, and show it"
+
+        self.window.run_command("rpn")
+        listener = rpn_event.RPNEvent.instance
+        if listener is None:
+            return
+
+        listener.record('m', 'mode_programmer')
+        listener.mode_programmer()
+        if words:
+            listener.push_values(words)
+        listener.message = message
+
+        view = self.window.active_view()
+        if view is not None and view.name() == cfg.window_name:
+            listener.update_rpn(view)
@@ -0,0 +1,236 @@
+"""
+An append-only journal of the input that changes RPN's state, so that a session
+can be rebuilt after a crash.
+
+Records are small pickled tuples, each preceded by its length. They are buffered
+in memory and written and fsynced in batches, away from the main thread. A
+checkpoint of the whole state replaces the journal from time to time, so that
+replay stays short. A checkpoint is a series of pickled parts, written one at a
+time, so that it can be written in another thread without holding the whole
+state in memory.
+
+This module does not import sublime, so that journals can also be replayed
+outside of Sublime, for example as a benchmark workload.
+"""
+
+import os
+import struct
+import pickle
+import threading
+
+HEADER = struct.Struct('<I')
+
+#--------------------------------------------
+def encode(record):
+    data = pickle.dumps(record, protocol=2)
+    return HEADER.pack(len(data)) + data
+
+#--------------------------------------------
+def write_synced(ofile, data):
+    "Write data to a file, and wait until it is on disk"
+    ofile.write(data)
+    ofile.flush()
+    os.fsync(ofile.fileno())
+
+#--------------------------------------------
+def scan_records(path):
+    """
+    Generate (record, end offset) for the records in a journal file, stopping at
+    a record that was cut short by a crash.
+    """
+
+    try:
+        ifile = open(path, 'rb')
+    except (IOError, OSError):
+        return
+    with ifile:
+        while True:
+            header = ifile.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            size, = HEADER.unpack(header)
+            data = ifile.read(size)
+            if len(data) < size:
+                return
+            try:
+                record = pickle.loads(data)
+            except Exception:
+                return
+            yield record, ifile.tell()
+
+#--------------------------------------------
+def read_parts(path):
+    "Generate the parts of a checkpoint file, one at a time"
+
+    try:
+        ifile = open(path, 'rb')
+    except (IOError, OSError):
+        return
+    with ifile:
+        while True:
+            try:
+                yield pickle.load(ifile)
+            except EOFError:
+                return
+
+#--------------------------------------------
+def read_records(path):
+    "Generate the records in a journal file"
+    for record, _ in scan_records(path):
+        yield record
+
+########################################################################################
+class Journal(object):
+    """
+    The journal and checkpoint files in a directory.
+
+    Records are only buffered by append(), which is called on the main thread.
+    flush() writes and fsyncs them: it should be called from another thread when
+    batch_full is True. After checkpoint_every records, needs_checkpoint is True.
+    Records appended while a checkpoint is being written are kept in since, to
+    start the new journal.
+    """
+
+    def __init__(self, directory, batch_size=32, checkpoint_every=500):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, 'journal.bin')
+        self.checkpoint_path = os.path.join(directory, 'checkpoint.bin')
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.buffer = []
+        self.count = 0
+        self.file = None
+        self.since = None
+        self.lock = threading.Lock()          # guards the buffer, for append
+        self.write_lock = threading.Lock()    # held while the files are written
+
+    #--------------------------------------------
+    @property
+    def needs_checkpoint(self):
+        return self.count >= self.checkpoint_every and self.since is None
+
+    #--------------------------------------------
+    @property
+    def batch_full(self):
+        return len(self.buffer) == self.batch_size
+
+    #--------------------------------------------
+    def append(self, record):
+        with self.lock:
+            data = encode(record)
+            self.buffer.append(data)
+            if self.since is not None:
+                self.since.append(data)
+            self.count += 1
+
+    #--------------------------------------------
+    def flush(self):
+        "Write and fsync any buffered records. Records may be appended meanwhile."
+
+        with self.write_lock:
+            with self.lock:
+                data, self.buffer = b''.join(self.buffer), []
+                if not data:
+                    return
+                if self.file is None:
+                    self.file = open(self.path, 'ab')
+                ofile = self.file
+            write_synced(ofile, data)
+
+    #--------------------------------------------
+    def begin_checkpoint(self):
+        """
+        Call when the state to be checkpointed is taken. Returns a token to pass to
+        write_checkpoint, or None if a checkpoint is already being written.
+        """
+
+        with self.lock:
+            if self.since is not None:
+                return None
+            self.since = []
+            self.count = 0
+            return self.since
+
+    #--------------------------------------------
+    def write_checkpoint(self, token, parts):
+        """
+        Save the parts of the state taken at begin_checkpoint, and start a new journal
+        with the records appended since. May be called in another thread.
+        """
+
+        # until the checkpoint replaces it, the journal must hold every record
+        self.flush()
+
+        tmp_path = "{}.{}.tmp".format(self.checkpoint_path, id(token))
+        with open(tmp_path, 'wb') as ofile:
+            for part in parts:
+                pickle.dump(part, ofile, protocol=2)
+            ofile.flush()
+            os.fsync(ofile.fileno())
+
+        with self.write_lock:
+            with self.lock:
+                if self.since is not token:
+                    # the journal was reset while the checkpoint was written
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.checkpoint_path)
+
+                if self.file is not None:
+                    self.file.close()
+                self.file = ofile = open(self.path, 'wb')
+                data = b''.join(self.since)
+                self.buffer = []
+                self.since = None
+            write_synced(ofile, data)
+
+    #--------------------------------------------
+    def checkpoint(self, parts):
+        "Save the whole state, and start a new, empty journal"
+        token = self.begin_checkpoint()
+        if token is not None:
+            self.write_checkpoint(token, parts)
+
+    #--------------------------------------------
+    def recover(self):
+        """
+        Returns (the parts of the checkpoint, or None, list of records written since).
+        The parts are read as they are iterated, and must be read before the next checkpoint.
+        """
+
+        state = read_parts(self.checkpoint_path) if os.path.exists(self.checkpoint_path) else None
+        records, end = [], 0
+        for record, end in scan_records(self.path):
+            records.append(record)
+
+        # drop anything after the last complete record, so that new records follow it
+        if os.path.exists(self.path) and os.path.getsize(self.path) > end:
+            with open(self.path, 'r+b') as ofile:
+                ofile.truncate(end)
+
+        self.count = len(records)
+        return state, records
+
+    #--------------------------------------------
+    def reset(self):
+        "Discard the journal and checkpoint"
+
+        with self.write_lock, self.lock:
+            self.buffer = []
+            self.count = 0
+            self.since = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            for path in (self.path, self.checkpoint_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    #--------------------------------------------
+    def close(self):
+        self.flush()
+        with self.write_lock, self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
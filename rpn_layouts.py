@@ -0,0 +1,122 @@
+"""
+Named register layouts for programmer mode.
+
+Layouts are read from the register_layouts setting, each a list of
+[field name, msb, lsb]. They are compiled into tables of shifts and masks, so
+that a value is decoded into all of its fields, or encoded from them, in one
+pass. Compiled layouts are kept in Sublime's cache, and are compiled again only
+when the setting changes.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import sublime
+from . import rpn_bits
+from .rpn_settings import cfg
+
+CACHE_FILE = 'layouts.bin'
+CACHE_VERSION = 2
+
+#--------------------------------------------
+def compile_layout(fields):
+    "Returns a tuple of (name, msb, lsb, mask) for each field, most significant first"
+
+    if not isinstance(fields, list) or not fields:
+        raise ValueError("expected a list of [name, msb, lsb] fields")
+
+    table = []
+    for field in fields:
+        try:
+            name, msb, lsb = field if isinstance(field, list) else ()
+            msb, lsb = int(msb), int(lsb)
+        except (TypeError, ValueError):
+            raise ValueError("fields must be [name, msb, lsb], not {!r}".format(field))
+        rpn_bits.field_mask(msb, lsb)
+        table.append((str(name), msb, lsb, rpn_bits.width_mask(msb - lsb + 1)))
+    return tuple(sorted(table, key=lambda field: field[2], reverse=True))
+
+#--------------------------------------------
+def decode(layout, val):
+    "Returns (name, msb, lsb, value) for each field of the layout"
+    return [(name, msb, lsb, (val >> lsb) & mask) for name, msb, lsb, mask in layout]
+
+#--------------------------------------------
+def encode(layout, vals):
+    "Assemble a value from one value per field, least significant field first"
+
+    result = 0
+    for (name, msb, lsb, mask), val in zip(reversed(layout), vals):
+        val = int(val)
+        if val < 0 or val > mask:
+            raise ValueError("{} does not fit in {}[{}:{}]".format(val, name, msb, lsb))
+        result |= val << lsb
+    return result & cfg.bin_max_val
+
+#--------------------------------------------
+def report_errors(errors):
+    "Show the layouts that could not be compiled"
+    if errors:
+        sublime.status_message("RPN: ignoring register layouts {}".format("; ".join(errors)))
+
+########################################################################################
+class LayoutCache(object):
+    "The compiled layouts, compiled again only when the register_layouts setting changes"
+
+    def __init__(self):
+        self.definitions = None
+        self.layouts = {}
+
+    #--------------------------------------------
+    def get(self, definitions):
+        "Returns a dictionary of the compiled layouts, by name"
+
+        if definitions is not self.definitions:
+            self.layouts = self.load(definitions)
+            self.definitions = definitions
+        return self.layouts
+
+    #--------------------------------------------
+    def load(self, definitions):
+        "Read the compiled layouts from the cache file, or compile and save them"
+
+        if not definitions:
+            return {}
+        text = json.dumps([CACHE_VERSION, definitions], sort_keys=True)
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        path = os.path.join(sublime.cache_path(), 'RPN', CACHE_FILE)
+
+        # the layouts that could not be compiled are cached too, to be reported again
+        try:
+            with open(path, 'rb') as ifile:
+                cached_key, layouts, errors = pickle.load(ifile)
+            if cached_key == key:
+                report_errors(errors)
+                return layouts
+        except Exception:
+            pass
+
+        layouts, errors = {}, []
+        for name, fields in sorted(definitions.items()):
+            try:
+                layouts[name] = compile_layout(fields)
+            except ValueError as exc:
+                errors.append("{}: {}".format(name, exc))
+        report_errors(errors)
+
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path + '.tmp', 'wb') as ofile:
+                pickle.dump((key, layouts, errors), ofile, protocol=2)
+            os.replace(path + '.tmp', path)
+        except OSError as exc:
+            sublime.status_message("RPN: unable to cache register layouts: {}".format(exc))
+        return layouts
+
+layout_cache = LayoutCache()
+
+#--------------------------------------------
+def get_layouts():
+    return layout_cache.get(cfg.register_layouts)
@@ -0,0 +1,119 @@
+"""
+Settings for RPN, read from RPN.sublime-settings.
+
+Constants derived from the settings (masks, format strings, and so on) are
+computed when the settings are loaded, and again only when a setting changes.
+"""
+
+import sublime
+from decimal import Context
+from . import rpn_globals as glb
+from . import rpn_bits
+
+SETTINGS_FILE = "RPN.sublime-settings"
+
+# The settings, their defaults, and the type each must have
+DEFAULTS = (
+    ('window_name',           ">> rpn <<", str),
+    ('bin_max_bits',          48,          int),
+    ('sci_precision',         10,          int),
+    ('stack_window',          1000,        int),
+    ('undo_history',          100,         int),
+    ('worker_timeout',        10.0,        float),
+    ('worker_python',         None,        str),
+    ('import_parallel_bytes', 4000000,     int),
+    ('import_timeout',        None,        float),
+    ('readout_depth',         1,           int),
+    ('ingest_word_bytes',     4,           int),
+    ('ingest_endian',         "little",    str),
+    ('register_layouts',      {},          dict),
+    ('journal',               True,        bool),
+    ('journal_batch',         32,          int),
+    ('journal_checkpoint',    500,         int),
+)
+
+########################################################################################
+class RPNSettings(object):
+    "The current settings, as attributes, and the constants derived from them"
+
+    def __init__(self):
+        self.settings = None
+        for key, default, _ in DEFAULTS:
+            setattr(self, key, default)
+        self.derive()
+
+    #--------------------------------------------
+    def load(self):
+        "Load the settings file, and reload whenever it changes."
+
+        if self.settings is None:
+            self.settings = sublime.load_settings(SETTINGS_FILE)
+            self.settings.add_on_change('rpn', self.reload)
+        self.reload()
+
+    #--------------------------------------------
+    def unload(self):
+        if self.settings is not None:
+            self.settings.clear_on_change('rpn')
+            self.settings = None
+
+    #--------------------------------------------
+    def reload(self):
+        "Read the settings. Derived constants are re-computed only if something changed."
+
+        old_window_name = self.window_name
+        changed = False
+        for key, default, key_type in DEFAULTS:
+            value = self.settings.get(key, default)
+            if value is not None and not isinstance(value, key_type):
+                try:
+                    value = key_type(value)
+                except (TypeError, ValueError):
+                    sublime.status_message("RPN: ignoring setting {}: expected {}, got {!r}".format(key, key_type.__name__, value))
+                    value = default
+            if value != getattr(self, key):
+                setattr(self, key, value)
+                changed = True
+
+        if changed:
+            self.derive()
+
+        # rename any open RPN views, so that they (and their stacks) keep working
+        if self.window_name != old_window_name:
+            for window in sublime.windows():
+                for view in window.views():
+                    if view.name() == old_window_name:
+                        view.set_name(self.window_name)
+
+    #--------------------------------------------
+    def derive(self):
+        "Compute the constants that depend on the settings"
+
+        bits = max(1, self.bin_max_bits)
+        self.bin_max_val = rpn_bits.width_mask(bits)
+        self.sci_context = Context(prec=max(1, self.sci_precision))
+
+        # format strings for each base in programmer mode
+        self.programmer_formats = {
+            glb.BIN: "{:0%db}" % (bits),
+            glb.OCT: "{:0%do}" % (bits // 3),
+            glb.DEC: "{:d}",
+            glb.HEX: "{:0%dX}" % (bits // 4),
+        }
+
+        # bit numbers shown above the stack in binary
+        bin_header = "   "
+        for num in range(bits-1, 0, -8):
+            num_spaces = 8 if num > 7 else 7
+            bin_header += "%d" % num + ' '*num_spaces
+        self.bin_header = bin_header + "0\n"
+
+cfg = RPNSettings()
+
+#--------------------------------------------
+def plugin_loaded():
+    cfg.load()
+
+#--------------------------------------------
+def plugin_unloaded():
+    cfg.unload()
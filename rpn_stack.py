@@ -0,0 +1,273 @@
+"""
+The RPN stack.
+
+Only the newest values are held in memory. When there are more than the
+stack_window setting allows, the oldest are packed into chunks and spilled to
+a temporary memory-mapped file, to be paged back in when needed. Chunks may be
+read in another thread, for example to save a checkpoint.
+"""
+
+import mmap
+import pickle
+import weakref
+import tempfile
+import threading
+from array import array
+from .rpn_settings import cfg
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+########################################################################################
+class Labeled(float):
+    "A value shown with a label, such as an imported aggregate. Arithmetic on it returns a plain float."
+
+    def __new__(cls, val, label):
+        obj = float.__new__(cls, val)
+        obj.label = label
+        return obj
+
+    def __reduce__(self):
+        return (Labeled, (float(self), self.label))
+
+########################################################################################
+class SpillFile(object):
+    "An append-only temporary file of packed chunks, read through a memory map"
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        self.map = None
+        self.stacks = weakref.WeakSet()     # the stacks that may hold chunks of this file
+        self.lock = threading.Lock()
+
+    #--------------------------------------------
+    def write(self, data):
+        "Append data, returning its offset"
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            self.file.write(data)
+            self.size += len(data)
+            return offset
+
+    #--------------------------------------------
+    def read(self, offset, nbytes):
+        with self.lock:
+            if self.map is None or len(self.map) < offset + nbytes:
+                # the file has grown since it was mapped
+                self.file.flush()
+                if self.map is not None:
+                    self.map.close()
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.map[offset:offset+nbytes]
+
+    #--------------------------------------------
+    def release(self, chunk, owner):
+        """
+        Reuse the space of a chunk that owner has paged back in, if it is the last
+        in the file and no other stack holds it. A stack holding the last chunk in
+        the file must hold it as its own newest chunk.
+        """
+
+        offset, nbytes = chunk[:2]
+        if offset + nbytes != self.size:
+            return
+        if any(stack is not owner and stack.chunks and stack.chunks[-1] == chunk for stack in self.stacks):
+            return
+
+        with self.lock:
+            self.size = offset
+            self.file.truncate(offset)
+            if self.map is not None:
+                # the map must not reach past the end of the file
+                self.map.close()
+                self.map = None
+
+    #--------------------------------------------
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __del__(self):
+        self.close()
+
+#--------------------------------------------
+def pack(values):
+    """
+    Pack a list of values into bytes. Returns (kind, data), where kind is an array
+    typecode, or 'p' for values that do not fit in doubles or 64-bit integers.
+    """
+
+    if all(type(val) is float for val in values):
+        return 'd', array('d', values).tobytes()
+    if all(type(val) is int and INT64_MIN <= val <= INT64_MAX for val in values):
+        return 'q', array('q', values).tobytes()
+    return 'p', pickle.dumps(values, protocol=2)
+
+#--------------------------------------------
+def unpack(kind, data):
+    if kind == 'p':
+        return pickle.loads(data)
+    values = array(kind)
+    values.frombytes(data)
+    return values.tolist()
+
+########################################################################################
+class SpillStack(object):
+    """
+    A list-like stack: newest values in memory, older ones spilled to disk in chunks.
+
+    Spilled chunks are never modified, so copies of the stack (such as those kept
+    for undo) share them, and copying costs no more than the in-memory window.
+    """
+
+    def __init__(self, values=()):
+        self.spill = None       # SpillFile, shared with copies
+        self.chunks = []        # (offset, nbytes, kind, count) of spilled chunks, oldest first
+        self.spilled = 0        # number of values in chunks
+        self.values = []        # values held in memory, newest last
+        self.extend(values)
+
+    #--------------------------------------------
+    def copy(self):
+        dup = SpillStack()
+        dup.spill = self.spill
+        if self.spill is not None:
+            self.spill.stacks.add(dup)
+        dup.chunks = self.chunks[:]
+        dup.spilled = self.spilled
+        dup.values = self.values[:]
+        return dup
+
+    #--------------------------------------------
+    def append(self, val):
+        self.values.append(val)
+        if len(self.values) > max(2, cfg.stack_window):
+            self.spill_oldest()
+
+    #--------------------------------------------
+    def extend(self, values):
+        for val in values:
+            self.append(val)
+
+    #--------------------------------------------
+    def pop(self):
+        if not self.values:
+            if not self.chunks:
+                raise IndexError("pop from empty stack")
+            self.page_in()
+        return self.values.pop()
+
+    #--------------------------------------------
+    def spill_oldest(self):
+        "Write the oldest half of the in-memory values to the spill file"
+
+        count = len(self.values) // 2
+        kind, data = pack(self.values[:count])
+        if self.spill is None:
+            self.spill = SpillFile()
+            self.spill.stacks.add(self)
+        self.chunks.append((self.spill.write(data), len(data), kind, count))
+        self.spilled += count
+        del self.values[:count]
+
+    #--------------------------------------------
+    def page_in(self):
+        "Read the newest spilled chunk back into memory"
+
+        chunk = self.chunks.pop()
+        self.values[:0] = self.read_chunk(chunk)
+        self.spilled -= chunk[3]
+        self.spill.release(chunk, self)
+
+    #--------------------------------------------
+    def read_chunk(self, chunk):
+        offset, nbytes, kind, count = chunk
+        return unpack(kind, self.spill.read(offset, nbytes))
+
+    #--------------------------------------------
+    def visible(self):
+        "Returns (number of spilled values, list of in-memory values) for display"
+        return self.spilled, self.values
+
+    #--------------------------------------------
+    def __len__(self):
+        return self.spilled + len(self.values)
+
+    #--------------------------------------------
+    def __iter__(self):
+        "Iterate from oldest to newest, paging spilled chunks in one at a time"
+        for chunk in self.chunks:
+            for val in self.read_chunk(chunk):
+                yield val
+        for val in self.values:
+            yield val
+
+    #--------------------------------------------
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return list(self)[idx]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("stack index out of range")
+        if idx >= self.spilled:
+            return self.values[idx - self.spilled]
+        for chunk in self.chunks:
+            if idx < chunk[3]:
+                return self.read_chunk(chunk)[idx]
+            idx -= chunk[3]
+
+    #--------------------------------------------
+    def __repr__(self):
+        return "SpillStack({} spilled, {!r})".format(self.spilled, self.values)
+
+#--------------------------------------------
+def dump_stacks(stacks):
+    """
+    Generate the parts of a list of stacks, for saving: the number of distinct spilled
+    chunks, each of those chunks as (kind, count, data), then each stack as (chunk
+    numbers, kind, data of its in-memory values). A chunk shared by copies of a stack
+    is read and saved once.
+    """
+
+    numbers, chunks = {}, []
+    for stack in stacks:
+        for chunk in stack.chunks:
+            key = (id(stack.spill), chunk)
+            if key not in numbers:
+                numbers[key] = len(chunks)
+                chunks.append((stack.spill, chunk))
+
+    yield len(chunks)
+    for spill, (offset, nbytes, kind, count) in chunks:
+        yield kind, count, spill.read(offset, nbytes)
+    for stack in stacks:
+        kind, data = pack(stack.values)
+        yield [numbers[id(stack.spill), chunk] for chunk in stack.chunks], kind, data
+
+#--------------------------------------------
+def load_stacks(parts, count):
+    """
+    Generate count stacks from an iterator of the parts generated by dump_stacks.
+    The chunks are written, without unpacking them, to one new spill file.
+    """
+
+    spill, chunks = None, []
+    for _ in range(next(parts)):
+        kind, chunk_count, data = next(parts)
+        if spill is None:
+            spill = SpillFile()
+        chunks.append((spill.write(data), len(data), kind, chunk_count))
+
+    for _ in range(count):
+        numbers, kind, data = next(parts)
+        stack = SpillStack()
+        if numbers:
+            stack.spill = spill
+            spill.stacks.add(stack)
+            stack.chunks = [chunks[number] for number in numbers]
+            stack.spilled = sum(chunk[3] for chunk in stack.chunks)
+        stack.values = unpack(kind, data)
+        yield stack
@@ -0,0 +1,283 @@
+"""
+Runs expensive computations in a separate Python process, so that they can be
+timed out or cancelled without hanging Sublime.
+
+This module must not import sublime: its source is also executed by the worker.
+"""
+
+import os
+import sys
+import csv
+import math
+import pickle
+import subprocess
+import threading
+import multiprocessing
+from array import array
+
+########################################################################################
+# Computations that may be run in the worker
+
+FLOAT_EXACT = 2 ** 53       # every integer up to this is exactly representable in a float
+
+#--------------------------------------------
+def whole(num):
+    """
+    Returns an integral float as an int, if the float holds it exactly. Numbers typed
+    in scientific mode are floats. Larger floats are rounded, so they are kept as floats.
+    """
+    if isinstance(num, float) and num.is_integer() and abs(num) <= FLOAT_EXACT:
+        return int(num)
+    return num
+
+#--------------------------------------------
+def factorial(vals):
+    # newer Pythons refuse floats here, even integral ones
+    return math.factorial(whole(vals[0]))
+
+#--------------------------------------------
+def exponent(vals):
+    base, power = whole(vals[1]), whole(vals[0])
+    if isinstance(base, int) and isinstance(power, int) and power >= 0:
+        # exact result for integers, which would otherwise overflow a float
+        return base ** power
+    return math.pow(base, power)
+
+#--------------------------------------------
+def shift_left_many(vals):
+    return vals[1] << vals[0]
+
+#--------------------------------------------
+def range_lines(ifile, end):
+    "Generate the decoded lines of a binary file that start before end"
+    while ifile.tell() < end:
+        line = ifile.readline()
+        if not line:
+            return
+        yield line.decode('utf-8', 'replace')
+
+#--------------------------------------------
+def read_columns(vals):
+    """
+    Parse the lines of a CSV file that start in the byte range [start, end). vals is
+    (path, start, end, delimiter, indexes, has_header). Returns the numeric values of
+    each column in indexes, skipping anything else, as the bytes of an array of doubles.
+    Fields holding newlines are not supported, since ranges are split at newlines.
+    """
+
+    path, start, end, delimiter, indexes, has_header = vals
+    columns = [array('d') for _ in indexes]
+    with open(path, 'rb') as ifile:
+        if start > 0:
+            # begin with the first line that starts in the range
+            ifile.seek(start - 1)
+            ifile.readline()
+        elif has_header:
+            ifile.readline()
+
+        pairs = list(zip(indexes, columns))
+        for row in csv.reader(range_lines(ifile, end), delimiter=delimiter):
+            for index, column in pairs:
+                try:
+                    column.append(float(row[index]))
+                except (IndexError, ValueError):
+                    pass
+    return [column.tobytes() for column in columns]
+
+#--------------------------------------------
+def column_stats(values):
+    "Returns a dictionary of count, sum, avg, median, and (sample) stddev of an array of values"
+
+    count = len(values)
+    if count == 0:
+        return {'count': 0}
+
+    total = sum(values)
+    avg = total / count
+    stddev = math.sqrt(sum((val - avg) ** 2 for val in values) / (count - 1)) if count > 1 else 0.0
+    ordered = sorted(values)
+    midpoint = count // 2
+    median = ordered[midpoint] if count % 2 else (ordered[midpoint] + ordered[midpoint-1]) / 2
+    return {'count': count, 'sum': total, 'avg': avg, 'median': median, 'stddev': stddev}
+
+#--------------------------------------------
+def aggregate_column(vals):
+    "Returns the column_stats of a column. vals is (bytes of an array of doubles,)."
+    values = array('d')
+    values.frombytes(vals[0])
+    return column_stats(values)
+
+OPERATIONS = {
+    'factorial':        factorial,
+    'exponent':         exponent,
+    'shift_left_many':  shift_left_many,
+    'read_columns':     read_columns,
+    'aggregate_column': aggregate_column,
+}
+
+#--------------------------------------------
+def result_bits(name, vals):
+    "Estimate the number of bits in the result of an operation, without computing it."
+
+    if name == 'factorial':
+        num = whole(vals[0])
+        return num * math.log(num, 2) if num > 2 else 0
+    elif name == 'exponent':
+        base, power = whole(vals[1]), whole(vals[0])
+        if isinstance(base, int) and isinstance(power, int) and power > 0:
+            return base.bit_length() * power
+    elif name == 'shift_left_many':
+        if vals[0] > 0:
+            return abs(int(vals[1])).bit_length() + vals[0]
+    return 0
+
+#--------------------------------------------
+def is_expensive(name, vals, min_bits):
+    "Returns True if the operation should be run in a worker process."
+    try:
+        return result_bits(name, vals) >= min_bits
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+########################################################################################
+# Worker process
+
+# The worker is started with 'python -c', so it works even when RPN is installed
+# as a zipped .sublime-package.
+BOOTSTRAP = "\n".join((
+    "import pickle, sys",
+    "source, name, vals = pickle.load(sys.stdin.buffer)",
+    "namespace = {'__name__': 'rpn_worker_process'}",
+    "exec(compile(source, 'rpn_worker.py', 'exec'), namespace)",
+    "namespace['serve'](name, vals)",
+))
+
+#--------------------------------------------
+def serve(name, vals):
+    "Runs in the worker: compute and write the pickled (status, value) to stdout"
+    try:
+        result = ('ok', OPERATIONS[name](vals))
+    except Exception as exc:
+        result = ('error', str(exc))
+    pickle.dump(result, sys.stdout.buffer, protocol=2)
+    sys.stdout.flush()
+
+#--------------------------------------------
+def get_source():
+    "Returns the source of this module, to be sent to the worker."
+    try:
+        return __loader__.get_source(__name__)
+    except Exception:
+        with open(__file__) as ifile:
+            return ifile.read()
+
+#--------------------------------------------
+def python_executable(configured=None):
+    """
+    Return the Python interpreter used for worker processes. Inside Sublime,
+    sys.executable is the plugin host, so fall back to python on the PATH.
+    """
+
+    if configured:
+        return configured
+    if os.path.basename(sys.executable or '').lower().startswith('python'):
+        return sys.executable
+    return 'python' if os.name == 'nt' else 'python3'
+
+#--------------------------------------------
+def startupinfo():
+    "On Windows, keep the worker from opening a console window"
+    if os.name != 'nt':
+        return None
+    info = subprocess.STARTUPINFO()
+    info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return info
+
+########################################################################################
+class Job(threading.Thread):
+    """
+    Runs one operation in a worker process. When it finishes, times out, or fails,
+    done(job, status, value) is called from the job's thread, where status is
+    one of 'ok', 'error', 'timeout', or 'cancelled'.
+    """
+
+    def __init__(self, op, vals, done, timeout=None, python=None):
+        super(Job, self).__init__()
+        self.daemon = True
+        self.op = op
+        self.vals = vals
+        self.done = done
+        self.timeout = timeout
+        self.python = python_executable(python)
+        self.proc = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    #--------------------------------------------
+    def run(self):
+        payload = pickle.dumps((get_source(), self.op, self.vals), protocol=2)
+        with self.lock:
+            if self.cancelled:
+                return
+            try:
+                self.proc = subprocess.Popen([self.python, '-c', BOOTSTRAP], stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                             startupinfo=startupinfo())
+            except OSError as exc:
+                self.done(self, 'error', "unable to start worker {}: {}".format(self.python, exc))
+                return
+
+        try:
+            try:
+                out, err = self.proc.communicate(payload, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.communicate()
+                self.done(self, 'timeout', self.timeout)
+                return
+
+            if self.cancelled:
+                self.done(self, 'cancelled', None)
+            elif self.proc.returncode != 0 or not out:
+                lines = err.decode('utf-8', 'replace').strip().splitlines()
+                self.done(self, 'error', lines[-1] if lines else "worker exited with {}".format(self.proc.returncode))
+            else:
+                status, value = pickle.loads(out)
+                self.done(self, status, value)
+        except Exception as exc:
+            # for example, output that is not a pickle: the job must still finish
+            self.done(self, 'error', str(exc))
+
+    #--------------------------------------------
+    def cancel(self):
+        "Kill the worker process"
+        with self.lock:
+            self.cancelled = True
+            if self.proc is not None and self.proc.poll() is None:
+                self.proc.kill()
+
+#--------------------------------------------
+def run_jobs(op, vals_list, timeout=None, python=None, processes=None):
+    """
+    Run op once for each item in vals_list, in up to processes worker processes
+    at a time. Blocks until all are finished, and returns a list of (status, value).
+    """
+
+    results = [('cancelled', None)] * len(vals_list)
+    slots = threading.BoundedSemaphore(processes or multiprocessing.cpu_count())
+
+    def done(job, status, value):
+        results[job.index] = (status, value)
+        slots.release()
+
+    jobs = []
+    for index, vals in enumerate(vals_list):
+        slots.acquire()
+        job = Job(op, vals, done, timeout=timeout, python=python)
+        job.index = index
+        job.start()
+        jobs.append(job)
+
+    for job in jobs:
+        job.join()
+    return results
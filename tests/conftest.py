@@ -0,0 +1,27 @@
+"""
+Drive RPN headlessly in tests, with the stand-in sublime modules of the benchmarks.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import sublime_stub
+
+sublime_stub.install()
+
+#--------------------------------------------
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    "A fresh cache folder, so that each test has its own journal"
+    monkeypatch.setattr(sublime_stub, 'CACHE_PATH', str(tmp_path))
+    del sublime_stub.pending[:]
+    return tmp_path
+
+#--------------------------------------------
+@pytest.fixture
+def rpn(cache, monkeypatch):
+    "A new RPN listener and view, without a journal. Returns (listener, view)"
+    monkeypatch.setattr(sys.modules['RPN.rpn_settings'].cfg, 'journal', False)
+    return sublime_stub.new_rpn_view()
@@ -0,0 +1,142 @@
+import sys
+import random
+import pytest
+
+rpn_bits = sys.modules['RPN.rpn_bits']
+
+WIDTHS = (1, 7, 8, 12, 24, 48, 64, 65)
+
+#--------------------------------------------
+def values(bits, count=200, seed=1972):
+    "Random values of a width, with the edge cases"
+    rng = random.Random(seed + bits)
+    mask = (1 << bits) - 1
+    return [0, 1, mask, mask >> 1, 1 << (bits - 1)] + [rng.getrandbits(bits) for _ in range(count)]
+
+#--------------------------------------------
+def bit_string(val, bits):
+    "The bits of a value, most significant first"
+    return ''.join(str((val >> idx) & 1) for idx in range(bits - 1, -1, -1))
+
+#--------------------------------------------
+@pytest.mark.parametrize('bits', WIDTHS)
+def test_counting(bits):
+    for val in values(bits):
+        text = bit_string(val, bits)
+        assert rpn_bits.popcount(val, bits) == text.count('1')
+        assert rpn_bits.parity(val, bits) == text.count('1') % 2
+        assert rpn_bits.leading_zeros(val, bits) == len(text) - len(text.lstrip('0'))
+        assert rpn_bits.trailing_zeros(val, bits) == len(text) - len(text.rstrip('0'))
+
+#--------------------------------------------
+@pytest.mark.parametrize('bits', WIDTHS)
+def test_counting_ignores_bits_above_the_width(bits):
+    for val in values(bits):
+        assert rpn_bits.popcount(val | (1 << bits), bits) == rpn_bits.popcount(val, bits)
+        assert rpn_bits.leading_zeros(val | (1 << bits), bits) == rpn_bits.leading_zeros(val, bits)
+
+#--------------------------------------------
+@pytest.mark.parametrize('bits', WIDTHS)
+def test_reordering(bits):
+    nbytes = (bits + 7) // 8
+    for val in values(bits):
+        text = bit_string(val, bits)
+        assert rpn_bits.bit_reverse(val, bits) == int(text[::-1], 2)
+
+        swapped = sum(((val >> (8 * idx)) & 0xFF) << (8 * (nbytes - 1 - idx)) for idx in range(nbytes))
+        assert rpn_bits.byte_swap(val, bits) == swapped & ((1 << bits) - 1)
+
+        for count in (0, 1, 3, bits - 1, bits, bits + 5):
+            shift = count % bits
+            assert rpn_bits.rotate_left(val, count, bits) == int(text[shift:] + text[:shift], 2)
+            assert rpn_bits.rotate_right(val, count, bits) == int(text[bits-shift:] + text[:bits-shift], 2)
+
+#--------------------------------------------
+@pytest.mark.parametrize('bits', (8, 24, 48))
+def test_fields(bits):
+    rng = random.Random(bits)
+    for val in values(bits, 50):
+        lsb = rng.randrange(bits)
+        msb = rng.randrange(lsb, bits)
+        field = rng.getrandbits(bits)
+        inside = [lsb <= idx <= msb for idx in range(bits)]
+
+        def per_bit(func):
+            return sum(func(idx, (val >> idx) & 1) << idx for idx in range(bits))
+
+        assert rpn_bits.get_field(val, msb, lsb) == (val >> lsb) % (1 << (msb - lsb + 1))
+        assert rpn_bits.set_field(val, msb, lsb, bits) == per_bit(lambda idx, bit: 1 if inside[idx] else bit)
+        assert rpn_bits.clear_field(val, msb, lsb, bits) == per_bit(lambda idx, bit: 0 if inside[idx] else bit)
+        assert rpn_bits.toggle_field(val, msb, lsb, bits) == per_bit(lambda idx, bit: bit ^ inside[idx])
+        assert rpn_bits.insert_field(val, field, msb, lsb, bits) == \
+            per_bit(lambda idx, bit: (field >> (idx - lsb)) & 1 if inside[idx] else bit)
+
+#--------------------------------------------
+def test_field_order():
+    with pytest.raises(ValueError):
+        rpn_bits.field_mask(3, 4)
+    with pytest.raises(ValueError):
+        rpn_bits.field_mask(3, -1)
+
+#--------------------------------------------
+def split_lanes(val, lane, bits):
+    "The value of each lane, lane 0 first, as the lanes covering bits"
+    return [(val >> shift) & ((1 << lane) - 1) for shift in range(0, bits, lane)]
+
+#--------------------------------------------
+def join_lanes(lanes, lane, bits):
+    return sum(val << (idx * lane) for idx, val in enumerate(lanes)) & ((1 << bits) - 1)
+
+#--------------------------------------------
+def per_lane(func, a, b, lane, bits):
+    "Apply func to the lanes of a and b, one lane at a time"
+    return join_lanes([func(x, y) for x, y in zip(split_lanes(a, lane, bits), split_lanes(b, lane, bits))],
+                      lane, bits)
+
+LANES = [(lane, bits) for lane in (8, 16, 32) for bits in (24, 48, 64)]
+
+#--------------------------------------------
+@pytest.mark.parametrize('lane, bits', LANES)
+def test_lane_arithmetic(lane, bits):
+    top = (1 << lane) - 1
+    pairs = list(zip(values(bits), reversed(values(bits, seed=7))))
+    for a, b in pairs:
+        assert rpn_bits.lane_add(a, b, lane, bits) == per_lane(lambda x, y: (x + y) & top, a, b, lane, bits)
+        assert rpn_bits.lane_add(a, b, lane, bits, True) == per_lane(lambda x, y: min(x + y, top), a, b, lane, bits)
+        assert rpn_bits.lane_sub(a, b, lane, bits) == per_lane(lambda x, y: (x - y) & top, a, b, lane, bits)
+        assert rpn_bits.lane_sub(a, b, lane, bits, True) == per_lane(lambda x, y: max(x - y, 0), a, b, lane, bits)
+        assert rpn_bits.lane_mul(a, b, lane, bits) == per_lane(lambda x, y: (x * y) & top, a, b, lane, bits)
+        assert rpn_bits.lane_mul(a, b, lane, bits, True) == per_lane(lambda x, y: min(x * y, top), a, b, lane, bits)
+
+#--------------------------------------------
+@pytest.mark.parametrize('lane, bits', LANES)
+def test_lane_comparisons(lane, bits):
+    top = (1 << lane) - 1
+    pairs = list(zip(values(bits), reversed(values(bits, seed=7))))
+    # lanes that are equal, and lanes that differ only in their highest or lowest bit
+    pairs += [(a, a) for a, _ in pairs[:20]]
+    pairs += [(a, a ^ rpn_bits.lane_masks(lane, bits)[1]) for a, _ in pairs[:20]]
+    pairs += [(a, a ^ rpn_bits.lane_masks(lane, bits)[0]) for a, _ in pairs[:20]]
+    for a, b in pairs:
+        a, b = a & ((1 << bits) - 1), b & ((1 << bits) - 1)
+        assert rpn_bits.lane_min(a, b, lane, bits) == per_lane(min, a, b, lane, bits)
+        assert rpn_bits.lane_max(a, b, lane, bits) == per_lane(max, a, b, lane, bits)
+        assert rpn_bits.lane_equal(a, b, lane, bits) == per_lane(lambda x, y: top if x == y else 0, a, b, lane, bits)
+        assert rpn_bits.lane_greater(a, b, lane, bits) == per_lane(lambda x, y: top if x > y else 0, a, b, lane, bits)
+
+#--------------------------------------------
+@pytest.mark.parametrize('lane, bits', LANES)
+def test_lane_shifts(lane, bits):
+    top = (1 << lane) - 1
+    for val in values(bits, 50):
+        for count in (0, 1, lane // 2, lane - 1, lane, lane + 3):
+            assert rpn_bits.lane_shift_left(val, count, lane, bits) == \
+                per_lane(lambda x, _: (x << count) & top, val, 0, lane, bits)
+            assert rpn_bits.lane_shift_right(val, count, lane, bits) == \
+                per_lane(lambda x, _: x >> count, val, 0, lane, bits)
+
+#--------------------------------------------
+@pytest.mark.parametrize('lane, bits', LANES)
+def test_lane_values(lane, bits):
+    for val in values(bits, 20):
+        assert list(rpn_bits.lane_values(val, lane, bits)) == split_lanes(val, lane, bits)[::-1]
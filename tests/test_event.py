@@ -0,0 +1,91 @@
+import sys
+
+glb = sys.modules['RPN.rpn_globals']
+
+#--------------------------------------------
+def programmer(rpn):
+    listener, view = rpn
+    listener.mode = glb.PROGRAMMER
+    listener.base = glb.DEC
+    return listener, view
+
+#--------------------------------------------
+def test_lane_prefix_applies_to_one_command(rpn):
+    listener, view = programmer(rpn)
+    view.type("65535\n1\n;+")
+    assert list(listener.stack) == [0xFF00]
+    assert not listener.lane_pending
+
+    view.type("1+")
+    assert list(listener.stack) == [0xFF01]
+
+#--------------------------------------------
+def test_other_keys_cancel_the_lane_prefix(rpn):
+    listener, view = programmer(rpn)
+    view.type("1\n2\n;x")
+    assert list(listener.stack) == [1]
+    assert not listener.lane_pending
+
+    view.type(";U")
+    assert list(listener.stack) == [1, 2]
+    assert not listener.lane_pending
+
+    view.type(";$")
+    assert not listener.lane_pending
+    assert listener.message.startswith("ERROR")
+
+    view.type("+")
+    assert list(listener.stack) == [3]
+
+#--------------------------------------------
+def test_lane_prefix_toggles(rpn):
+    listener, view = programmer(rpn)
+    view.type("65535\n1\n;")
+    assert listener.lane_pending
+    view.type(";")
+    assert not listener.lane_pending
+    view.type("+")
+    assert list(listener.stack) == [65536]
+
+#--------------------------------------------
+def scientific(rpn, keys):
+    listener, view = rpn
+    listener.mode = glb.SCIENTIFIC
+    view.type(keys)
+    return listener
+
+#--------------------------------------------
+def test_map_one_value_command(rpn):
+    assert list(scientific(rpn, "4\n9\n16\nMr").stack) == [2, 3, 4]
+
+#--------------------------------------------
+def test_map_two_value_command_uses_the_top_of_the_stack(rpn):
+    assert list(scientific(rpn, "1\n2\n3\n2\nM*").stack) == [2, 4, 6]
+
+#--------------------------------------------
+def test_map_count_prefix(rpn):
+    assert list(scientific(rpn, "1\n2\n3\n4\n3Mq").stack) == [1, 4, 9, 16]
+
+#--------------------------------------------
+def test_map_count_larger_than_the_stack(rpn):
+    listener = scientific(rpn, "1\n2\n5Mq")
+    assert list(listener.stack) == [1, 2]
+    assert listener.message.startswith("ERROR")
+
+#--------------------------------------------
+def test_reduce(rpn):
+    assert list(scientific(rpn, "1\n2\n3\nR+").stack) == [6]
+
+#--------------------------------------------
+def test_reduce_folds_from_the_oldest_value(rpn):
+    assert list(scientific(rpn, "10\n3\n2\nR-").stack) == [5]
+    assert list(scientific(rpn, "X16\n2\n4\nR/").stack) == [2]
+
+#--------------------------------------------
+def test_map_error_restores_the_stack(rpn):
+    listener = scientific(rpn, "2\n0\n4\nMI")
+    assert list(listener.stack) == [2, 0, 4]
+
+    # the failed map left no step of its own to undo
+    rpn[1].type("U")
+    assert list(listener.stack) == [2, 0]
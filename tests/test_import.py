@@ -0,0 +1,19 @@
+import sys
+
+rpn_import = sys.modules['RPN.rpn_import']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+
+#--------------------------------------------
+def test_parallel_import_matches_inline(tmp_path, monkeypatch):
+    path = tmp_path / 'data.csv'
+    path.write_text("a,b\n" + "".join("{},{}\n".format(num, num * num) for num in range(1000)))
+    delimiter, names, has_header = rpn_import.sniff(str(path))
+
+    monkeypatch.setattr(rpn_import.multiprocessing, 'cpu_count', lambda: 4)
+    monkeypatch.setattr(cfg, 'import_parallel_bytes', 0)
+    columns = rpn_import.read_columns(str(path), [0, 1], delimiter, has_header)
+    parallel = rpn_import.aggregate_columns(columns, True)
+
+    assert [len(column) for column in columns] == [1000, 1000]
+    assert parallel == rpn_import.aggregate_columns(columns, False)
+    assert parallel[0]['sum'] == sum(range(1000))
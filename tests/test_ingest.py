@@ -0,0 +1,57 @@
+import sys
+import struct
+import pytest
+
+rpn_ingest = sys.modules['RPN.rpn_ingest']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+
+#--------------------------------------------
+def test_xxd():
+    # xxd of "Hello, world!\nAB  CD ef\n": a short final line, and ASCII columns with spaces
+    dump = ("00000000: 4865 6c6c 6f2c 2077 6f72 6c64 210a 4142  Hello, world!.AB\n"
+            "00000010: 2020 4344 2065 660a                        CD ef.\n")
+    assert rpn_ingest.hex_to_bytes(dump) == b"Hello, world!\nAB  CD ef\n"
+
+#--------------------------------------------
+def test_plain_hex():
+    expected = bytes.fromhex('deadbeef0102')
+    for text in ('deadbeef0102', 'de ad be ef 01 02', '0xdead_beef\n0x0102', 'DEAD_BEEF, 0X01; 02'):
+        assert rpn_ingest.hex_to_bytes(text) == expected
+
+#--------------------------------------------
+def test_invalid_hex():
+    with pytest.raises(ValueError):
+        rpn_ingest.hex_to_bytes('abc')
+    with pytest.raises(ValueError):
+        rpn_ingest.hex_to_bytes('zz')
+
+#--------------------------------------------
+@pytest.mark.parametrize('endian', ('little', 'big'))
+@pytest.mark.parametrize('word_bytes', (1, 2, 3, 4, 5, 8))
+def test_unpack_words(word_bytes, endian, monkeypatch):
+    monkeypatch.setattr(cfg, 'bin_max_bits', 64)
+    monkeypatch.setattr(cfg, 'bin_max_val', (1 << 64) - 1)
+    data = bytes(range(1, 24))
+    count = len(data) // word_bytes
+    expected = [int.from_bytes(data[idx:idx+word_bytes], endian) for idx in range(0, count * word_bytes, word_bytes)]
+
+    # bytes take the struct path for 1, 2, 4, and 8-byte words, the memoryview path for others
+    assert rpn_ingest.unpack_words(data, word_bytes, endian) == (expected, len(data) % word_bytes)
+    assert rpn_ingest.unpack_words(bytearray(data), word_bytes, endian) == (expected, len(data) % word_bytes)
+
+#--------------------------------------------
+def test_words_are_masked_to_bin_max_bits():
+    words, leftover = rpn_ingest.unpack_words(struct.pack('<QQ', (1 << 64) - 1, 1 << 50), 8, 'little')
+    assert words == [cfg.bin_max_val, (1 << 50) & cfg.bin_max_val] and leftover == 0
+
+    words, leftover = rpn_ingest.unpack_words(bytes([0xFF] * 14), 7, 'big')
+    assert words == [cfg.bin_max_val] * 2 and leftover == 0
+
+#--------------------------------------------
+def test_raw_file(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(struct.pack('<3I', 1, 2, 3) + b'\x04')
+    assert rpn_ingest.read_raw_words(str(path), 4, 'little') == ([1, 2, 3], 1)
+
+    path.write_bytes(b'')
+    assert rpn_ingest.read_raw_words(str(path), 4, 'little') == ([], 0)
@@ -0,0 +1,79 @@
+import sys
+import sublime_stub
+
+rpn_event = sys.modules['RPN.rpn_event']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+
+#--------------------------------------------
+def start(monkeypatch, checkpoint_every):
+    monkeypatch.setattr(cfg, 'journal', True)
+    monkeypatch.setattr(cfg, 'journal_checkpoint', checkpoint_every)
+    listener = rpn_event.RPNEvent()
+    listener.open_journal()
+    return listener
+
+#--------------------------------------------
+def crash_and_recover(listener, monkeypatch):
+    "Write what the journal holds, then recover it in a new session, as after a crash"
+    sublime_stub.run_pending()
+    listener.journal.flush()
+    return start(monkeypatch, cfg.journal_checkpoint)
+
+#--------------------------------------------
+def test_recover_across_checkpoints(cache, monkeypatch):
+    listener = start(monkeypatch, 20)
+    for num in range(25):
+        listener.process([str(num)])
+        sublime_stub.run_pending()
+
+    recovered = crash_and_recover(listener, monkeypatch)
+    assert list(recovered.stack) == [float(num) for num in range(25)]
+
+#--------------------------------------------
+def test_recover_undo_history(cache, monkeypatch):
+    listener = start(monkeypatch, 1000)
+    for num in range(70):
+        listener.process([str(num)])
+    listener.checkpoint()
+    for _ in range(60):
+        listener.process([listener.undo])
+
+    recovered = crash_and_recover(listener, monkeypatch)
+    assert list(recovered.stack) == list(listener.stack) == [float(num) for num in range(10)]
+
+#--------------------------------------------
+def test_undo_history_is_bounded(cache, monkeypatch):
+    monkeypatch.setattr(cfg, 'undo_history', 10)
+    listener = start(monkeypatch, 1000)
+    for num in range(30):
+        listener.process([str(num)])
+    assert len(listener.prev_stack) == 10
+    listener.checkpoint()
+    for _ in range(15):
+        listener.process([listener.undo])
+
+    recovered = crash_and_recover(listener, monkeypatch)
+    assert list(recovered.stack) == list(listener.stack) == [float(num) for num in range(20)]
+
+#--------------------------------------------
+def test_records_are_written_in_the_async_thread(cache, monkeypatch):
+    monkeypatch.setattr(cfg, 'journal_batch', 4)
+    listener = start(monkeypatch, 1000)
+    for num in range(4):
+        listener.process([str(num)])
+    assert listener.journal.file is None
+
+    sublime_stub.run_pending()
+    recovered = start(monkeypatch, 1000)
+    assert list(recovered.stack) == [0.0, 1.0, 2.0, 3.0]
+
+#--------------------------------------------
+def test_recovery_keeps_the_clipboard(cache, monkeypatch):
+    listener = start(monkeypatch, 1000)
+    listener.process(['42', listener.copy_value])
+    assert sublime_stub.get_clipboard() == '42'
+
+    sublime_stub.set_clipboard("something else")
+    recovered = crash_and_recover(listener, monkeypatch)
+    assert list(recovered.stack) == [42.0]
+    assert sublime_stub.get_clipboard() == "something else"
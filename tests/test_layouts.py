@@ -0,0 +1,69 @@
+import sys
+import pytest
+
+glb = sys.modules['RPN.rpn_globals']
+rpn_layouts = sys.modules['RPN.rpn_layouts']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+
+FIELDS = [["opcode", 7, 0], ["rd", 11, 8], ["imm", 23, 12]]
+
+#--------------------------------------------
+def test_compile_layout():
+    layout = rpn_layouts.compile_layout(FIELDS)
+    assert layout == (("imm", 23, 12, 0xFFF), ("rd", 11, 8, 0xF), ("opcode", 7, 0, 0xFF))
+
+#--------------------------------------------
+@pytest.mark.parametrize('fields', ([], {}, [["a", 3]], [["a", 0, 3]], [["a", 3, -1]], [["a", "x", 0]], ["a"]))
+def test_compile_invalid_layout(fields):
+    with pytest.raises(ValueError):
+        rpn_layouts.compile_layout(fields)
+
+#--------------------------------------------
+def test_decode_and_encode():
+    layout = rpn_layouts.compile_layout(FIELDS)
+    val = 0xABC5_3F
+    assert rpn_layouts.decode(layout, val) == [("imm", 23, 12, 0xABC), ("rd", 11, 8, 5), ("opcode", 7, 0, 0x3F)]
+    # encode takes the fields least significant first, as they are popped
+    assert rpn_layouts.encode(layout, [0x3F, 5, 0xABC]) == val
+
+#--------------------------------------------
+def test_encode_field_too_large():
+    layout = rpn_layouts.compile_layout(FIELDS)
+    with pytest.raises(ValueError):
+        rpn_layouts.encode(layout, [0x100, 0, 0])
+    with pytest.raises(ValueError):
+        rpn_layouts.encode(layout, [-1, 0, 0])
+
+#--------------------------------------------
+def test_cached_errors_are_reported_again(cache, monkeypatch):
+    messages = []
+    monkeypatch.setattr(rpn_layouts.sublime, 'status_message', messages.append)
+    definitions = {"good": FIELDS, "bad": [["a", 0, 3]]}
+
+    assert list(rpn_layouts.LayoutCache().load(definitions)) == ["good"]
+    assert len(messages) == 1 and "bad" in messages[0]
+
+    # a new session reads the compiled layouts from the cache file
+    assert list(rpn_layouts.LayoutCache().load(definitions)) == ["good"]
+    assert len(messages) == 2 and messages[1] == messages[0]
+
+#--------------------------------------------
+def test_encode_without_layouts_leaves_nothing_to_undo(rpn, monkeypatch):
+    monkeypatch.setattr(cfg, 'register_layouts', {})
+    listener, view = rpn
+    listener.mode = glb.PROGRAMMER
+    view.type("1\n2\n")
+    undos = len(listener.prev_stack)
+    view.type("}")
+    assert listener.message.startswith("ERROR")
+    assert len(listener.prev_stack) == undos
+
+#--------------------------------------------
+def test_encode_keystroke(rpn, monkeypatch):
+    monkeypatch.setattr(cfg, 'register_layouts', {"insn": FIELDS})
+    listener, view = rpn
+    listener.mode, listener.base = glb.PROGRAMMER, glb.HEX
+    view.type("ABC\n5\n3F\n}")
+    assert list(listener.stack) == [0xABC53F]
+    view.type("U")
+    assert list(listener.stack) == [0xABC, 5, 0x3F]
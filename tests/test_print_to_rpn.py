@@ -0,0 +1,40 @@
+import sys
+import sublime_stub
+
+glb = sys.modules['RPN.rpn_globals']
+print_to_rpn = sys.modules['RPN.print_to_rpn']
+
+#--------------------------------------------
+def printer(mode, base):
+    cmd = print_to_rpn.PrintToRpnCommand(sublime_stub.View())
+    cmd.run(None, stack=[], mode=mode, prev_mode=mode, help_str=None,
+            base=base, notation=glb.REGULAR, message="")
+    return cmd
+
+#--------------------------------------------
+def test_huge_int_in_dec_lanes():
+    cmd = printer(glb.PROGRAMMER, glb.DEC)
+    cmd.lanes = 16
+    val = (3 << 2000) | 0x000100020003
+    assert cmd.print_val(val) == '1.2.3'
+
+#--------------------------------------------
+def test_huge_int_shown_from_leading_digits():
+    cmd = printer(glb.BASIC, glb.DEC)
+    assert cmd.print_val(2 ** 5000).startswith('1.41246')
+
+#--------------------------------------------
+def test_huge_int_in_hex_oct_bin():
+    val = (1 << 100000000) | 0xABC
+    for base, leading in ((glb.HEX, '1000_'), (glb.OCT, '2000_'), (glb.BIN, '1000_')):
+        cmd = printer(glb.PROGRAMMER, base)
+        val_str = cmd.print_val(val)
+        assert val_str.startswith(leading) and val_str.endswith('...  (100000001 bits)')
+        assert len(val_str) < 100
+    assert print_to_rpn.full_digits(val, glb.HEX).endswith('0ABC')
+
+#--------------------------------------------
+def test_huge_int_in_hex_lanes():
+    cmd = printer(glb.PROGRAMMER, glb.HEX)
+    cmd.lanes = 16
+    assert cmd.print_val((3 << 2000) | 0x000100020003) == '0001_0002_0003'
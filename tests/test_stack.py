@@ -0,0 +1,58 @@
+import sys
+import random
+import pytest
+
+rpn_stack = sys.modules['RPN.rpn_stack']
+cfg = sys.modules['RPN.rpn_settings'].cfg
+
+#--------------------------------------------
+def random_value(rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return rng.uniform(-1e6, 1e6)
+    if kind == 1:
+        return rng.randrange(-1000, 1000)
+    return rng.getrandbits(100)
+
+#--------------------------------------------
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_a_list(seed, monkeypatch):
+    "Push, pop, undo, and index at random, with undo copies, against plain lists"
+
+    monkeypatch.setattr(cfg, 'stack_window', 4)
+    rng = random.Random(seed)
+    stack, expected = rpn_stack.SpillStack(), []
+    undos = []      # (copy of the stack, copy of the list)
+
+    for _ in range(5000):
+        action = rng.random()
+        if action < 0.3:
+            undos.append((stack.copy(), expected[:]))
+            del undos[:-20]
+            values = [random_value(rng) for _ in range(rng.randrange(1, 12))]
+            stack.extend(values)
+            expected.extend(values)
+        elif action < 0.6:
+            if expected:
+                assert stack.pop() == expected.pop()
+            else:
+                with pytest.raises(IndexError):
+                    stack.pop()
+        elif action < 0.7 and undos:
+            stack, expected = undos.pop()
+        elif action < 0.8:
+            stack.append(random_value(rng))
+            expected.append(stack[-1])
+        elif expected:
+            idx = rng.randrange(-len(expected), len(expected))
+            assert stack[idx] == expected[idx]
+
+        assert len(stack) == len(expected)
+
+    assert list(stack) == expected
+    for copy, values in undos:
+        assert list(copy) == values
+    # the spill file is truncated as chunks are paged in, but never below a chunk in use
+    assert stack.spill is None or all(offset + nbytes <= stack.spill.size
+                                      for held in [stack] + [copy for copy, _ in undos]
+                                      for offset, nbytes, _, _ in held.chunks)
@@ -0,0 +1,32 @@
+import os
+import sys
+import stat
+import math
+import pytest
+
+rpn_worker = sys.modules['RPN.rpn_worker']
+
+#--------------------------------------------
+def test_exponent_of_integral_floats_is_exact():
+    assert rpn_worker.exponent([100.0, 2.0]) == 2 ** 100
+
+#--------------------------------------------
+def test_exponent_of_large_float_overflows():
+    # 1e300 is not an exact integer, so it keeps float semantics
+    with pytest.raises(OverflowError):
+        rpn_worker.exponent([2.0, 1e300])
+    assert rpn_worker.exponent([2.0, 1e100]) == math.pow(1e100, 2)
+
+#--------------------------------------------
+@pytest.mark.skipif(os.name == 'nt', reason="the stand-in worker is a shell script")
+def test_job_with_invalid_output_finishes(tmp_path):
+    python = tmp_path / 'python3'
+    python.write_text("#!/bin/sh\ncat > /dev/null\necho not a pickle\n")
+    python.chmod(python.stat().st_mode | stat.S_IEXEC)
+
+    results = []
+    job = rpn_worker.Job('factorial', [5], lambda job, status, value: results.append(status),
+                         timeout=10, python=str(python))
+    job.start()
+    job.join(10)
+    assert results == ['error']